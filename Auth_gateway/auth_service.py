@@ -1,13 +1,36 @@
 from fastapi import FastAPI, Response, Request, HTTPException
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-import requests
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import asyncio
 import httpx
 import jwt
 import logging
+import orjson
 import os
+import re
+import time
+from typing import Any
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for all outbound calls so Keycloak connections stay warm
+    app.state.client = httpx.AsyncClient(
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        timeout=httpx.Timeout(60.0),
+    )
+    await _load_signing_keys(app.state.client)
+    try:
+        yield
+    finally:
+        await app.state.client.aclose()
+
+
+# JSON endpoints declare a return type so FastAPI serialises them straight
+# to bytes through Pydantic
+app = FastAPI(lifespan=lifespan)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -34,26 +57,126 @@ CLIENT_ID = os.getenv("KEYCLOAK_CLIENT_ID", "public-client")
 GATEWAY_CALLBACK = os.getenv("GATEWAY_CALLBACK")
 FRONTEND_CALLBACK = os.getenv("FRONTEND_CALLBACK")
 
+# Redirect targets only depend on the settings above, so build them once
+LOGIN_URL = (
+    f"{KEYCLOAK_PUBLIC_URL}/realms/{REALM}/protocol/openid-connect/auth"
+    f"?client_id={CLIENT_ID}"
+    f"&response_type=code"
+    f"&redirect_uri={GATEWAY_CALLBACK}"
+)
+LOGOUT_URL = (
+    f"{KEYCLOAK_PUBLIC_URL}/realms/{REALM}/protocol/openid-connect/logout"
+    f"?client_id={CLIENT_ID}"
+    f"&post_logout_redirect_uri={(GATEWAY_CALLBACK or '').replace('/callback', '/post-logout')}"
+)
+
+# Keycloak stamps `iss` with the URL the token was requested through: the
+# public URL for browser flows, the internal one for the gateway's exchange
+KEYCLOAK_ISSUERS = frozenset(
+    f"{url}/realms/{REALM}"
+    for url in (KEYCLOAK_PUBLIC_URL, KEYCLOAK_INTERNAL_URL)
+    if url
+)
+
+# Whole-word match inside the space-separated OAuth scope string
+_MUTUAL_FUNDS_SCOPE_RE = re.compile(r"(?<!\S)MutualFunds(?!\S)")
+
+# Decoded claims are reused for this many seconds before `exp` is re-checked
+CLAIMS_CACHE_TTL = 30
+
+# Minimum seconds between JWKS fetches triggered by unknown or missing keys
+JWKS_REFRESH_COOLDOWN = 10
+
+_signing_keys: dict[str, jwt.PyJWK] = {}
+_jwks_fetched_at = float("-inf")
+_jwks_lock = asyncio.Lock()
+
+
+async def _load_signing_keys(client: httpx.AsyncClient) -> bool:
+    global _jwks_fetched_at
+    _jwks_fetched_at = time.monotonic()
+    try:
+        certs_response = await client.get(
+            f"{KEYCLOAK_INTERNAL_URL}/realms/{REALM}/protocol/openid-connect/certs",
+            timeout=10.0
+        )
+        certs_response.raise_for_status()
+        jwks = jwt.PyJWKSet.from_dict(orjson.loads(certs_response.content))
+    except Exception as e:
+        logger.error(f"Failed to load Keycloak signing keys: {str(e)}")
+        return False
+
+    # Replace rather than merge so keys Keycloak has retired stop verifying
+    _signing_keys.clear()
+    _signing_keys.update({key.key_id: key for key in jwks.keys})
+    _decode_cached.cache_clear()
+    logger.info(f"Loaded {len(_signing_keys)} Keycloak signing keys")
+    return True
+
+
+async def _refresh_signing_keys(client: httpx.AsyncClient) -> bool:
+    """Refetch the JWKS unless it was fetched within JWKS_REFRESH_COOLDOWN."""
+    async with _jwks_lock:
+        if time.monotonic() - _jwks_fetched_at < JWKS_REFRESH_COOLDOWN:
+            return False
+        return await _load_signing_keys(client)
+
+
+def _has_unknown_kid(token: str) -> bool:
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except jwt.PyJWTError:
+        return False
+    return kid not in _signing_keys
+
+
+@lru_cache(maxsize=4096)
+def _decode_cached(token: str, ttl_bucket: int):
+    try:
+        key = _signing_keys.get(jwt.get_unverified_header(token).get("kid"))
+        if key is None:
+            return None
+        return jwt.decode(
+            token,
+            key.key,
+            algorithms=["RS256"],
+            issuer=KEYCLOAK_ISSUERS,
+            options={"verify_aud": False}
+        )
+    except jwt.PyJWTError as e:
+        logger.warning(f"Rejected access token: {str(e)}")
+        return None
+
+
+async def decode_token(token: str, client: httpx.AsyncClient):
+    ttl_bucket = int(time.time() // CLAIMS_CACHE_TTL)
+    claims = _decode_cached(token, ttl_bucket)
+    # Keys missing at startup (Keycloak not up yet) or rotated since are
+    # fetched on demand; the refresh clears the cached rejection
+    if claims is None and _has_unknown_kid(token):
+        if await _refresh_signing_keys(client):
+            claims = _decode_cached(token, ttl_bucket)
+    return claims
+
+
+async def current_claims(request: Request) -> dict | None:
+    """Decode the access_token cookie at most once per request."""
+    if not hasattr(request.state, "claims"):
+        token = request.cookies.get("access_token")
+        request.state.claims = (
+            await decode_token(token, request.app.state.client) if token else None
+        )
+    return request.state.claims
+
 
 @app.get("/api/auth/login")
 def login():
-    keycloak_login_url = (
-        f"{KEYCLOAK_PUBLIC_URL}/realms/{REALM}/protocol/openid-connect/auth"
-        f"?client_id={CLIENT_ID}"
-        f"&response_type=code"
-        f"&redirect_uri={GATEWAY_CALLBACK}" 
-    )
-    return RedirectResponse(keycloak_login_url)
+    return RedirectResponse(LOGIN_URL)
 
 
 @app.get("/api/auth/logout")
 def logout():
-    logout_url = (
-        f"{KEYCLOAK_PUBLIC_URL}/realms/{REALM}/protocol/openid-connect/logout"
-        f"?client_id={CLIENT_ID}"
-        f"&post_logout_redirect_uri={GATEWAY_CALLBACK.replace('/callback', '/post-logout')}"
-    )
-    response = RedirectResponse(url=logout_url)
+    response = RedirectResponse(url=LOGOUT_URL)
 
     for cookie_name in ["access_token", "user_id", "username", "roles", "scope"]:
         response.delete_cookie(cookie_name, path="/", domain="localhost")
@@ -65,7 +188,7 @@ def post_logout():
     return RedirectResponse(url=FRONTEND_CALLBACK)
 
 @app.get("/api/auth/callback")
-def callback(code: str = None):
+async def callback(request: Request, code: str = None):
     if not code:
         logger.error("No code received from Keycloak")
         return RedirectResponse(f"{FRONTEND_CALLBACK}/login-error")
@@ -78,17 +201,17 @@ def callback(code: str = None):
             "redirect_uri": GATEWAY_CALLBACK
         }
         
-        token_response = requests.post(
+        token_response = await request.app.state.client.post(
             f"{KEYCLOAK_INTERNAL_URL}/realms/{REALM}/protocol/openid-connect/token",
             data=payload,
             headers={"Content-Type": "application/x-www-form-urlencoded"},
-            timeout=10
+            timeout=10.0
         )
         if token_response.status_code != 200:
             logger.error(f"Keycloak exchange failed: {token_response.text}")
             raise HTTPException(status_code=400, detail=token_response.text)
 
-        token_data = token_response.json()
+        token_data = orjson.loads(token_response.content)
         access_token = token_data.get("access_token")
 
         response = RedirectResponse(url=f"{FRONTEND_CALLBACK}/login-callback")
@@ -108,15 +231,42 @@ def callback(code: str = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/auth/me")
-async def me(request: Request):
+async def me(request: Request) -> dict[str, Any]:
     user_id = request.headers.get("X-User-Id")
     if not user_id:
-        return {"authenticated": False}
+        # Only decode when the gateway did not already supply the identity
+        claims = await current_claims(request)
+        if not claims:
+            return {"authenticated": False}
+
+        client_access = claims.get("resource_access", {}).get(CLIENT_ID, {})
+        return {
+            "authenticated": True,
+            "user_id": claims.get("sub"),
+            "username": claims.get("preferred_username"),
+            "roles": client_access.get("roles", []),
+            "scope": "MutualFunds" if _MUTUAL_FUNDS_SCOPE_RE.search(claims.get("scope", "")) else ""
+        }
 
+    headers = request.headers
+    roles_header = headers.get("X-User-Roles")
     return {
         "authenticated": True,
         "user_id": user_id,
-        "username": request.headers.get("X-Username"),
-        "roles": request.headers.get("X-User-Roles", "").split(",") if request.headers.get("X-User-Roles") else [],
-        "scope": request.headers.get("X-User-Scope", "")
+        "username": headers.get("X-Username"),
+        "roles": roles_header.split(",") if roles_header else [],
+        "scope": headers.get("X-User-Scope", "")
     }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "auth_service:app",
+        host="0.0.0.0",
+        port=8280,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
@@ -17,6 +17,26 @@ if not token then
     return ngx.exit(401)
 end
 
+-- Reuse the headers derived from this token for a short while
+local CLAIMS_CACHE_TTL = 60
+local claims_cache = ngx.shared.auth_claims
+
+local function set_identity_headers(identity)
+    ngx.req.set_header("X-User-Id", identity.sub)
+    ngx.req.set_header("X-Username", identity.username)
+    ngx.req.set_header("X-User-Roles", identity.roles)
+    ngx.req.set_header("X-User-Scope", identity.scope)
+end
+
+local cached = claims_cache:get(token)
+if cached then
+    local identity = cjson.decode(cached)
+    if identity then
+        set_identity_headers(identity)
+        return
+    end
+end
+
 local parts = {}
 for part in string.gmatch(token, "([^.]+)") do table.insert(parts, part) end
 
@@ -35,19 +55,27 @@ if data then
         roles = table.concat(data.resource_access["public-client"].roles or {}, ",")
     end
     local mf_scope = ""
-    if data.scope then
-        for s in string.gmatch(data.scope, "%S+") do
-            if s == "MutualFunds" then
-                mf_scope = "MutualFunds"
-                break
-            end
-        end
+    -- Single plain search over the space-delimited scope claim
+    if data.scope and (" " .. data.scope .. " "):find(" MutualFunds ", 1, true) then
+        mf_scope = "MutualFunds"
     end
 
-    ngx.req.set_header("X-User-Id", data.sub or "")
-    ngx.req.set_header("X-Username", data.preferred_username or "")
-    ngx.req.set_header("X-User-Roles", roles)
-    ngx.req.set_header("X-User-Scope", mf_scope)
+    local identity = {
+        sub = data.sub or "",
+        username = data.preferred_username or "",
+        roles = roles,
+        scope = mf_scope,
+    }
+    set_identity_headers(identity)
+
+    -- Never keep an entry past the token's own expiry
+    local ttl = CLAIMS_CACHE_TTL
+    if type(data.exp) == "number" then
+        ttl = math.min(ttl, data.exp - ngx.time())
+    end
+    if ttl > 0 then
+        claims_cache:set(token, cjson.encode(identity), ttl)
+    end
 end
 
-end
\ No newline at end of file
+end
@@ -194,19 +194,33 @@ export class ChatComponent {
     this.messages.update(msgs => [...msgs, { role: 'user', content: userMsg }]);
     this.isTyping.set(true);
 
+    let assistantMsg = '';
+    let frame = 0;
+    // Re-render the (markdown) reply at most once per frame, not per token
+    const flush = () => {
+      frame = 0;
+      this.messages.update(msgs => {
+        const newMsgs = [...msgs];
+        newMsgs[newMsgs.length - 1] = { role: 'assistant', content: assistantMsg };
+        return newMsgs;
+      });
+    };
+    const flushPending = () => {
+      if (!frame) return;
+      cancelAnimationFrame(frame);
+      flush();
+    };
+
     try {
-      let assistantMsg = '';
       this.messages.update(msgs => [...msgs, { role: 'assistant', content: '' }]);
 
       for await (const chunk of this.chatService.streamChat(userMsg, this.threadId())) {
         assistantMsg += chunk;
-        this.messages.update(msgs => {
-          const newMsgs = [...msgs];
-          newMsgs[newMsgs.length - 1] = { role: 'assistant', content: assistantMsg };
-          return newMsgs;
-        });
+        if (!frame) frame = requestAnimationFrame(flush);
       }
+      flushPending();
     } catch (err) {
+      flushPending();
       console.error(err);
       this.messages.update(msgs => [...msgs, { role: 'assistant', content: 'Error: Failed to get response.' }]);
     } finally {
@@ -13,17 +13,31 @@ featuring:
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
 import os
+import time
+from functools import lru_cache
 from typing import Any
 
+import anyio
+import httpx
+import orjson
 from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph, add_messages
 from langgraph.types import Command, interrupt
 from typing_extensions import Annotated, TypedDict
 
+from src.utils.bedrock import get_chat_model
+from src.utils.tools import invoke_tool
+from src.utils.tools import is_write_tool_name as _is_write_operation
+
+try:
+    from mcp.shared.exceptions import McpError
+    from mcp.types import CONNECTION_CLOSED
+except ImportError:  # installed with langchain-mcp-adapters
+    McpError = None
+
 # Configure logging
 logger = logging.getLogger(__name__)
 logger.setLevel(os.getenv("AGENT_LOG_LEVEL", "INFO"))
@@ -83,10 +97,9 @@ Guidelines:
 - For write operations, wait for user confirmation before proceeding
 - Never assume user intent for destructive operations
 - Provide helpful context when operations might have side effects
-- If an user is asking about any particular question,it should understand the question and call the correct tool.if that user has no access to that tool, it should respond with an appropriate message.
+- Understand each question the user asks and call the correct tool for it. If the user has no access to that tool, respond with an appropriate message.
 - Dont reveal the tool details to the user.
-- Call only the correct tool based on the user question.Dont call unnecessary tools for a single question. 
-- Understand the user question and call that particular tool only.If that particular user is not authorized to access that tool, it should respond with an appropriate message.
+- Make one tool call per independent question and no unnecessary calls. When a message asks several independent questions, emit all of their calls together in one turn.
 
 You are an AI agent that answers user questions by calling backend tools.
 
@@ -96,12 +109,13 @@ You MUST follow these rules strictly:
 TOOL SELECTION RULES
 ────────────────────────────────────────
 
-1. FIRST, understand the user’s intent.
-2. Identify ONE correct tool that directly answers the question.
-3. Call ONLY that tool.
-4. NEVER call multiple tools for a single question.
-5. NEVER guess or explore tools.
-6. NEVER explain tool limitations to the user.
+1. FIRST, understand the user’s intent and split the message into its
+   independent questions (e.g. two different order IDs are two questions).
+2. For each question, identify the ONE correct tool that directly answers it.
+3. Make exactly one tool call per question, and emit the calls for all of
+   the questions together in the same turn. Make no other calls.
+4. NEVER guess or explore tools.
+5. NEVER explain tool limitations to the user.
 
 Mapping rules you MUST follow:
 - Order ID → use getOrderStatesByOrderId
@@ -175,7 +189,7 @@ def _parse_mcp_servers() -> dict[str, dict[str, str]]:
     mcp_config_str = os.getenv("MCP_SERVERS", "{}")
 
     try:
-        config = json.loads(mcp_config_str)
+        config = orjson.loads(mcp_config_str)
         servers = {}
         for server in config.get("servers", []):
             servers[server["name"]] = {
@@ -183,50 +197,91 @@ def _parse_mcp_servers() -> dict[str, dict[str, str]]:
                 "url": server["url"],
             }
         return servers
-    except (json.JSONDecodeError, KeyError) as e:
-        logger.error(f"Failed to parse MCP_SERVERS: {e}")
+    except (orjson.JSONDecodeError, KeyError) as e:
+        logger.error("Failed to parse MCP_SERVERS: %s", e)
         return {}
 
 
-async def _get_mcp_tools(user_context: UserContext) -> list[Any]:
-    """Initialize and retrieve tools from configured MCP servers.
+# Seconds a fetched MCP tool list is reused before the servers are asked again
+MCP_TOOLS_TTL = float(os.getenv("MCP_TOOLS_TTL", "300"))
 
-    Only returns tools that user has access to based on scope.
+# Shorter reuse for a list missing a server that failed or timed out, so its
+# tools come back soon without every turn waiting on a dead server
+MCP_TOOLS_PARTIAL_TTL = float(os.getenv("MCP_TOOLS_PARTIAL_TTL", "15"))
 
-    Args:
-        user_context: User authorization context with scope
+# (expires at, tools, tools keyed by name)
+_tools_cache: tuple[float, list[Any], dict[str, Any]] | None = None
+_tools_lock = asyncio.Lock()
+
+# Seconds a single server may take to list its tools
+MCP_TOOLS_TIMEOUT_S = float(os.getenv("MCP_TOOLS_TIMEOUT_S", "10"))
+
+
+# Chat model bound to each authorized tool subset, keyed by tool names and
+# rebuilt whenever the tool list is refetched
+_bound_models: dict[tuple[str, ...], Any] = {}
+
+
+# One long-lived client per configured server, rebuilt after a failure
+_mcp_clients: dict[tuple[str, str, str], Any] = {}
+
+
+def _client_key(server_name: str, server_config: dict[str, str]) -> tuple[str, str, str]:
+    return server_name, server_config["transport"], server_config["url"]
+
+
+def _get_mcp_client(client_cls: type, server_name: str, server_config: dict[str, str]) -> Any:
+    """Return the pooled MultiServerMCPClient for a server, creating it once."""
+    key = _client_key(server_name, server_config)
+    client = _mcp_clients.get(key)
+    if client is None:
+        client = client_cls(
+            {
+                server_name: {
+                    "transport": server_config["transport"],
+                    "url": server_config["url"],
+                }
+            }
+        )
+        _mcp_clients[key] = client
+    return client
+
+
+async def _fetch_mcp_tools() -> tuple[list[Any], bool]:
+    """Retrieve the de-duplicated tools from every configured MCP server.
 
     Returns:
-        List of authorized LangChain Tool objects from MCP servers
+        List of LangChain Tool objects from MCP servers, and whether every
+        server answered
     """
     try:
         from langchain_mcp_adapters.client import MultiServerMCPClient
     except ImportError as e:
-        logger.warning(f"MultiServerMCPClient missing: {e}")
-        return []
+        logger.warning("MultiServerMCPClient missing: %s", e)
+        return [], False
 
     servers = _parse_mcp_servers()
     if not servers:
         logger.warning("No MCP servers configured in MCP_SERVERS environment variable")
-        return []
+        return [], True
 
-    user_scope = user_context.get("scope", [])
     all_tools = []
     seen_tool_names = set()  
+    complete = True
 
     for server_name, server_config in servers.items():
-        logger.info(f"DEBUG: Attempting to connect to MCP server '{server_name}' at {server_config.get('url')}")
+        logger.debug(
+            "Attempting to connect to MCP server '%s' at %s",
+            server_name, server_config.get("url"),
+        )
         
         try:
-            mcp_config = {
-                server_name: {
-                "transport": server_config["transport"],  
-                "url": server_config["url"],
-            }
-            }
-
-            client = MultiServerMCPClient(mcp_config)
-            tools = await client.get_tools() 
+            client = _get_mcp_client(MultiServerMCPClient, server_name, server_config)
+            # Cancelling get_tools unwinds its session, so a timeout closes the
+            # connection instead of leaving the stream half-open
+            tools = await asyncio.wait_for(
+                client.get_tools(), timeout=MCP_TOOLS_TIMEOUT_S
+            )
             
             unique_tools = []
             for tool in tools:
@@ -235,28 +290,84 @@ async def _get_mcp_tools(user_context: UserContext) -> list[Any]:
                     seen_tool_names.add(tool_name)
                     unique_tools.append(tool)
                 else:
-                    logger.debug(f"Skipping duplicate tool: {tool_name}")
+                    logger.debug("Skipping duplicate tool: %s", tool_name)
             
             logger.info(
-                f"Loaded {len(unique_tools)} unique tools from {server_name} "
-                f"({len(tools) - len(unique_tools)} duplicates filtered) "
-                f"(authorized for user {user_context.get('user_id')})"
+                "Loaded %s unique tools from %s (%s duplicates filtered)",
+                len(unique_tools), server_name, len(tools) - len(unique_tools),
             )
             all_tools.extend(unique_tools)
         except Exception as e:
-            logger.error(f"Failed to load tools from {server_name}: {e}")
-            logger.warning(f"Continuing without tools from {server_name}. Other servers may still work.")
+            complete = False
+            _mcp_clients.pop(_client_key(server_name, server_config), None)
+            logger.error(
+                "Failed to load tools from %s, continuing without them: %s",
+                server_name, e,
+            )
             continue
 
-    logger.info(f"Total unique tools loaded: {len(all_tools)}")
+    logger.info("Total unique tools loaded: %s", len(all_tools))
+    return all_tools, complete
+
+
+def _invalidate_mcp_tools() -> None:
+    """Drop the cached tool list and clients so the next call reconnects."""
+    global _tools_cache
+    _tools_cache = None
+    _mcp_clients.clear()
+    _bound_models.clear()
+
+
+async def _load_mcp_tools() -> tuple[list[Any], dict[str, Any]]:
+    """Return the MCP tools and a name lookup, refetching once MCP_TOOLS_TTL has passed.
+
+    Empty results are not cached so a failed fetch is retried on the next call,
+    and a list missing a failed server is only kept for MCP_TOOLS_PARTIAL_TTL.
+    """
+    global _tools_cache
+
+    cached = _tools_cache
+    if cached and time.monotonic() < cached[0]:
+        return cached[1], cached[2]
+
+    async with _tools_lock:
+        cached = _tools_cache
+        if cached and time.monotonic() < cached[0]:
+            return cached[1], cached[2]
+
+        tools, complete = await _fetch_mcp_tools()
+        tools_by_name = {tool.name: tool for tool in tools}
+        if tools:
+            ttl = MCP_TOOLS_TTL if complete else MCP_TOOLS_PARTIAL_TTL
+            _tools_cache = (time.monotonic() + ttl, tools, tools_by_name)
+            _bound_models.clear()
+        return tools, tools_by_name
+
+
+async def _get_all_mcp_tools() -> list[Any]:
+    """Return every tool from the configured MCP servers."""
+    tools, _ = await _load_mcp_tools()
+    return tools
+
+
+async def _get_mcp_tools(user_context: UserContext) -> list[Any]:
+    """Retrieve the MCP tools the user is authorized to call.
+
+    Args:
+        user_context: User authorization context with roles
+
+    Returns:
+        List of authorized LangChain Tool objects from MCP servers
+    """
+    all_tools = await _get_all_mcp_tools()
     authorized_tools = [
         tool for tool in all_tools
         if _is_tool_authorized(tool.name, user_context)
     ]
 
     logger.info(
-        f"Authorized tools for user {user_context.get('user_id')}: "
-        f"{len(authorized_tools)}/{len(all_tools)}"
+        "Authorized tools for user %s: %s/%s",
+        user_context.get("user_id"), len(authorized_tools), len(all_tools),
     )
 
     return authorized_tools
@@ -265,15 +376,21 @@ async def _get_mcp_tools(user_context: UserContext) -> list[Any]:
 from src.agent.tool_authz import TOOL_ROLE_MAP
 
 def _is_tool_authorized(tool_name: str, user_context: dict) -> bool:
-    user_roles = {
+    user_roles = frozenset(
         r.lower()
         for r in user_context.get("roles", [])
         if isinstance(r, str)
-    }
+    )
 
     if not user_roles:
         return False
 
+    return _roles_allow_tool(tool_name, user_roles)
+
+
+@lru_cache(maxsize=1024)
+def _roles_allow_tool(tool_name: str, user_roles: frozenset[str]) -> bool:
+    """Check a tool against TOOL_ROLE_MAP, memoised per (tool, role set)."""
     allowed_roles = TOOL_ROLE_MAP.get(tool_name)
 
     if not allowed_roles:
@@ -282,17 +399,26 @@ def _is_tool_authorized(tool_name: str, user_context: dict) -> bool:
     return bool(user_roles & allowed_roles)
 
 
-def _is_write_operation(tool_name: str) -> bool:
-    """Determine if a tool call represents a write operation.
+@lru_cache(maxsize=1)
+def _get_chat_model() -> Any:
+    """Return the shared Bedrock chat model with the agent's system prompt."""
+    return get_chat_model(system=AGENT_SYSTEM_PROMPT)
 
-    Args:
-        tool_name: Name of the tool being called
 
-    Returns:
-        True if the operation is a write/mutating operation
-    """
-    write_keywords = ["create", "update", "delete", "add", "remove", "post", "put"]
-    return any(keyword in tool_name.lower() for keyword in write_keywords)
+async def _warm_chat_model() -> None:
+    """Build the Bedrock client off the event loop the first time it is needed."""
+    if _get_chat_model.cache_info().currsize == 0:
+        await asyncio.to_thread(_get_chat_model)
+
+
+def _get_bound_model(tools: list[Any]) -> Any:
+    """Return the chat model bound to these tools, converting their schemas once."""
+    key = tuple(tool.name for tool in tools)
+    bound = _bound_models.get(key)
+    if bound is None:
+        bound = _get_chat_model().bind_tools(tools)
+        _bound_models[key] = bound
+    return bound
 
 
 async def call_model(
@@ -313,52 +439,38 @@ async def call_model(
         Updated state with new messages from the LLM
     """
     try:
-        from langchain_aws.chat_models import ChatBedrock
         from langchain_core.messages import AIMessage
 
         user_context = config.get("configurable", {}).get("user", {})
-        mcp_tools = await _get_mcp_tools(user_context)
-
-        final_tools = {}
-        for tool in mcp_tools:
-            if tool.name not in final_tools:
-                final_tools[tool.name] = tool
-            else:
-                logger.warning(f"Duplicate tool detected and filtered: {tool.name}")
-        
-        mcp_tools = list(final_tools.values())
-        logger.info(f"Final tool count after deduplication: {len(mcp_tools)}")
-
-        model = ChatBedrock(
-            model_id=os.getenv(
-                "BEDROCK_MODEL_ID",
-                "anthropic.claude-3-5-sonnet-20241022-v2:0",
-            ),
-            region_name=os.getenv("AWS_REGION", "us-east-1"),
-            temperature=0,
-            max_tokens=4096,
-            model_kwargs={"system": AGENT_SYSTEM_PROMPT}
+        # Tool names are already unique; _fetch_mcp_tools drops duplicates
+        mcp_tools, _ = await asyncio.gather(
+            _get_mcp_tools(user_context), _warm_chat_model()
         )
 
-        model_with_tools = model.bind_tools(mcp_tools)
+        model_with_tools = _get_bound_model(mcp_tools)
 
         messages_to_send = state["messages"]
-        
-        message_types = [type(m).__name__ for m in messages_to_send]
-        logger.info(f"Sending messages types: {message_types}")
-        if messages_to_send:
-            logger.info(f"First message content: {messages_to_send[0].content[:50]}...")
 
-        response = model_with_tools.invoke(messages_to_send)
+        if messages_to_send and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Sending messages types: %s",
+                [type(m).__name__ for m in messages_to_send],
+            )
+            logger.debug(
+                "First message content: %.50s...", messages_to_send[0].content
+            )
+
+        response = await model_with_tools.ainvoke(messages_to_send)
 
         logger.info(
-            f"Model response for user {user_context.get('user_id')}: "
-            f"(tool_calls: {len(response.tool_calls) if hasattr(response, 'tool_calls') and response.tool_calls else 0})"
+            "Model response for user %s: (tool_calls: %s)",
+            user_context.get("user_id"),
+            len(response.tool_calls) if hasattr(response, "tool_calls") and response.tool_calls else 0,
         )
 
         return {"messages": [response]}
     except Exception as e:
-        logger.error(f"Error in call_model: {e}")
+        logger.error("Error in call_model: %s", e)
         from langchain_core.messages import AIMessage
 
         error_response = AIMessage(
@@ -384,6 +496,41 @@ def _should_continue(state: AgentState) -> str:
     return END
 
 
+# Seconds a single MCP tool call may run before it is abandoned
+TOOL_TIMEOUT_S = float(os.getenv("TOOL_TIMEOUT_S", "30"))
+
+# Failures of the MCP transport itself, as opposed to a bad or failed tool call
+_CONNECTION_ERRORS = (
+    ConnectionError,
+    httpx.TransportError,
+    anyio.BrokenResourceError,
+    anyio.ClosedResourceError,
+    anyio.EndOfStream,
+)
+
+
+def _is_connection_error(exc: BaseException) -> bool:
+    """Return True if the error means the MCP session can no longer be used."""
+    if isinstance(exc, BaseExceptionGroup):
+        return any(_is_connection_error(e) for e in exc.exceptions)
+    if isinstance(exc, _CONNECTION_ERRORS):
+        return True
+    return (
+        McpError is not None
+        and isinstance(exc, McpError)
+        and exc.error.code == CONNECTION_CLOSED
+    )
+
+
+def _on_tool_error(exc: Exception) -> None:
+    """Drop the pooled MCP sessions if a failed tool call left them unusable."""
+    # A timed-out session may still be waiting on the server, so don't reuse
+    # it. Tool errors and invalid arguments leave the session usable; only a
+    # broken connection is worth reconnecting and relisting every server
+    if isinstance(exc, asyncio.TimeoutError) or _is_connection_error(exc):
+        _invalidate_mcp_tools()
+
+
 async def handle_tool_calls(
     state: AgentState,
     config: RunnableConfig,
@@ -405,12 +552,12 @@ async def handle_tool_calls(
         return {"messages": []}
 
     tool_calls = last_message.tool_calls
-    results = []
+    results: list[ToolMessage | None] = []
+    pending = []
 
     try:
-        # Initialize MCP tools
-        mcp_tools = await _get_mcp_tools(user_context)
-        tools_by_name = {tool.name: tool for tool in mcp_tools}
+        # Each call is authorized below, so the shared lookup can be used as-is
+        _, tools_by_name = await _load_mcp_tools()
 
         # Process each tool call
         for tool_call in tool_calls:
@@ -418,9 +565,8 @@ async def handle_tool_calls(
             tool_args = tool_call.get("args", {})
 
             logger.info(
-                f"Processing tool call: {tool_name} "
-                f"user={user_context.get('user_id')} "
-                f"roles={user_context.get('roles')}"
+                "Processing tool call: %s user=%s roles=%s",
+                tool_name, user_context.get("user_id"), user_context.get("roles"),
             )
 
             tool = tools_by_name.get(tool_name)
@@ -428,9 +574,8 @@ async def handle_tool_calls(
            
             if not tool or not _is_tool_authorized(tool_name, user_context):
                 logger.warning(
-                    f"[AUTHZ] DENIED tool={tool_name} "
-                    f"user={user_context.get('user_id')} "
-                    f"roles={user_context.get('roles')}"
+                    "[AUTHZ] DENIED tool=%s user=%s roles=%s",
+                    tool_name, user_context.get("user_id"), user_context.get("roles"),
                 )
                 results.append(
                     ToolMessage(
@@ -462,13 +607,13 @@ async def handle_tool_calls(
                         if approval_response.resume.get("args"):
                             tool_args = approval_response.resume["args"]
                         logger.info(
-                            f"Write operation approved: {tool_name} "
-                            f"user={user_context.get('user_id')}"
+                            "Write operation approved: %s user=%s",
+                            tool_name, user_context.get("user_id"),
                         )
                     else:
                         logger.info(
-                            f"Write operation rejected: {tool_name} "
-                            f"user={user_context.get('user_id')}"
+                            "Write operation rejected: %s user=%s",
+                            tool_name, user_context.get("user_id"),
                         )
                         results.append(
                             ToolMessage(
@@ -478,27 +623,26 @@ async def handle_tool_calls(
                         )
                         continue
 
-            
-            try:
-                observation = await tool.ainvoke(tool_args)
-                logger.info(f"Tool execution successful: {tool_name}")
-            except Exception as e:
-                observation = f"Error executing tool: {str(e)}"
-                logger.error(
-                    f"Tool execution failed: {tool_name} - {str(e)}"
-                )
+            # Run approved calls after every approval has been collected
+            pending.append((len(results), tool, tool_args, tool_call["id"]))
+            results.append(None)
 
-            results.append(
-                ToolMessage(
-                    content=str(observation),
-                    tool_call_id=tool_call["id"],
-                )
+        observations = await asyncio.gather(
+            *(
+                invoke_tool(tool, tool_args, TOOL_TIMEOUT_S, _on_tool_error)
+                for _, tool, tool_args, _ in pending
+            )
+        )
+        for (slot, _, _, tool_call_id), observation in zip(pending, observations):
+            results[slot] = ToolMessage(
+                content=str(observation),
+                tool_call_id=tool_call_id,
             )
 
         return {"messages": results}
 
     except Exception as e:
-        logger.error(f"Error in handle_tool_calls: {e}")
+        logger.error("Error in handle_tool_calls: %s", e)
         return {
             "messages": [
                 ToolMessage(
@@ -522,7 +666,8 @@ async def initialize_checkpointer() -> Any:
         from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
     except ImportError as e:
         logger.warning(
-            f"PostgreSQL checkpointer not available: {e}. Using memory checkpointer."
+            "PostgreSQL checkpointer not available: %s. Using memory checkpointer.",
+            e,
         )
         from langgraph.checkpoint.memory import MemorySaver
 
@@ -540,14 +685,15 @@ async def initialize_checkpointer() -> Any:
         return checkpointer
     except Exception as e:
         logger.warning(
-            f"Failed to initialize PostgreSQL checkpointer: {e}. Using memory checkpointer."
+            "Failed to initialize PostgreSQL checkpointer: %s. Using memory checkpointer.",
+            e,
         )
         from langgraph.checkpoint.memory import MemorySaver
 
         return MemorySaver()
 
 
-async def create_agent_graph() -> StateGraph:
+def _build_graph() -> StateGraph:
     """Create and compile the agent graph.
 
     The graph follows this flow:
@@ -588,31 +734,24 @@ async def create_agent_graph() -> StateGraph:
     return compiled_graph
 
 
-# Graph instance
 _graph_instance = None
 
 
-async def get_graph():
-    """Get or create the graph instance (lazy initialization)."""
+def get_graph():
+    """Get the compiled graph, building it on first use."""
     global _graph_instance
     if _graph_instance is None:
-        _graph_instance = await create_agent_graph()
+        _graph_instance = _build_graph()
     return _graph_instance
 
 
-graph = None
+async def create_agent_graph() -> StateGraph:
+    """Create and compile the agent graph.
 
-try:
-    import asyncio
-    try:
-        asyncio.get_running_loop()
-        # Already in event loop - use lazy init
-        logger.info("Detected running event loop, graph will be lazily initialized")
-        graph = None
-    except RuntimeError:
-        # No event loop - safe to initialize synchronously
-        graph = asyncio.run(create_agent_graph())
-        logger.info("Graph initialized synchronously")
-except Exception as e:
-    logger.warning(f"Could not initialize graph: {e}. Will use lazy initialization.")
-    graph = None
+    Returns:
+        Compiled LangGraph StateGraph (shared with get_graph)
+    """
+    return get_graph()
+
+
+graph = get_graph()
@@ -12,12 +12,14 @@ This agent integrates with NAV (Net Asset Value) management APIs, featuring:
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
 import os
+from functools import lru_cache
+from pathlib import Path
 from typing import Any
 
 import httpx
+import orjson
 from langchain.tools import tool
 from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
@@ -25,6 +27,9 @@ from langgraph.graph import END, START, StateGraph
 from langgraph.types import Command, interrupt
 from typing_extensions import Annotated, TypedDict
 
+from src.utils.bedrock import get_chat_model
+from src.utils.tools import get_mcp_manager_cls, invoke_tool, is_write_tool_name
+
 # Configure logging
 logger = logging.getLogger(__name__)
 logger.setLevel(os.getenv("AGENT_LOG_LEVEL", "INFO"))
@@ -76,14 +81,37 @@ Guidelines:
 - NAV files should be in JSON format
 """
 
+_SYSTEM_MESSAGE = SystemMessage(content=AGENT_SYSTEM_PROMPT)
+
 
 def _get_api_base_url() -> str:
     """Get the NAV API base URL from environment."""
     return os.getenv("NAV_API_BASE_URL", "http://localhost:8088")
 
 
+# Pooled client for the upload API, created on first use inside the event loop
+_http_client: httpx.AsyncClient | None = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the pooled upload client; called when the server shuts down."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
 @tool
-def upload_nav_file(file_path: str) -> str:
+async def upload_nav_file(file_path: str) -> str:
     """Upload a NAV (Net Asset Value) file for processing.
 
     This tool handles file uploads that cannot be passed through MCP.
@@ -97,15 +125,12 @@ def upload_nav_file(file_path: str) -> str:
         Upload result from the API
     """
     try:
-        if not os.path.exists(file_path):
-            return f"Error: File not found at {file_path}"
-
         # Validate file extension
         if not file_path.lower().endswith(".json"):
-            logger.warning(f"File {file_path} is not a JSON file")
+            logger.warning("File %s is not a JSON file", file_path)
 
-        with open(file_path, "rb") as f:
-            file_content = f.read()
+        # Read in a worker thread so the event loop is not blocked on disk I/O
+        file_content = await asyncio.to_thread(Path(file_path).read_bytes)
 
         if not file_content:
             return "Error: File is empty"
@@ -114,43 +139,43 @@ def upload_nav_file(file_path: str) -> str:
         files = {"file": (file_name, file_content)}
 
         api_url = _get_api_base_url()
-        logger.info(f"Uploading NAV file to {api_url}/api/nav/upload")
+        logger.info("Uploading NAV file to %s/api/nav/upload", api_url)
         
-        response = httpx.post(
+        response = await _get_http_client().post(
             f"{api_url}/api/nav/upload",
             files=files,
             timeout=30.0,
         )
 
-        logger.info(f"Upload response status: {response.status_code}")
-        logger.info(f"Upload response body: {response.text}")
+        logger.info("Upload response status: %s", response.status_code)
+        logger.debug("Upload response body: %s", response.text)
 
         if response.status_code == 200:
-            try:
-                # Try to parse as JSON and return formatted response
-                result_json = response.json()
-                result_str = json.dumps(result_json, indent=2)
-            except:
-                # Fallback to raw text if JSON parsing fails
-                result_str = response.text
-            
             logger.info(
-                f"NAV file uploaded successfully: {file_name} "
-                f"(user: {os.getenv('CURRENT_USER_ID', 'unknown')})"
+                "NAV file uploaded successfully: %s (user: %s)",
+                file_name, os.getenv("CURRENT_USER_ID", "unknown"),
             )
-            return result_str
+            # Shown to the user verbatim, so keep the JSON indented
+            try:
+                return orjson.dumps(
+                    orjson.loads(response.content), option=orjson.OPT_INDENT_2
+                ).decode()
+            except orjson.JSONDecodeError:
+                return response.text
         else:
             error_msg = f"Upload failed with status {response.status_code}"
-            logger.error(f"{error_msg}: {response.text}")
+            logger.error("%s: %s", error_msg, response.text)
             return f"Error: {error_msg}. Details: {response.text}"
 
+    except FileNotFoundError:
+        return f"Error: File not found at {file_path}"
     except Exception as e:
-        logger.error(f"NAV file upload error: {str(e)}")
+        logger.error("NAV file upload error: %s", e)
         return f"Error uploading NAV file: {str(e)}"
 
 
 @tool
-def check_nav_service_health() -> str:
+async def check_nav_service_health() -> str:
     """Check if the NAV upload service is running and healthy.
 
     This tool performs a health check on the NAV service.
@@ -160,7 +185,7 @@ def check_nav_service_health() -> str:
     """
     try:
         api_url = _get_api_base_url()
-        response = httpx.get(
+        response = await _get_http_client().get(
             f"{api_url}/api/nav/health",
             timeout=10.0,
         )
@@ -174,10 +199,17 @@ def check_nav_service_health() -> str:
             return f"Error: {error_msg}"
 
     except Exception as e:
-        logger.error(f"NAV service health check error: {str(e)}")
+        logger.error("NAV service health check error: %s", e)
         return f"Error checking NAV service health: {str(e)}"
 
 
+# Roles permitted to use the NAV agent's tools
+_ALLOWED_ROLES = frozenset({"fundhouse"})
+
+# Tools that are safe and don't require approval
+_SAFE_TOOLS = frozenset({"upload_nav_file", "check_nav_service_health"})
+
+
 async def _get_tools(user_context: UserContext) -> list[Any]:
     """Initialize and retrieve tools for NAV agent.
 
@@ -192,24 +224,22 @@ async def _get_tools(user_context: UserContext) -> list[Any]:
     """
     tools_list = [upload_nav_file, check_nav_service_health]
 
-    try:
-        from langchain_mcp_adapters import ClientMCPManager
-    except ImportError as e:
-        logger.warning(f"langchain-mcp-adapters not installed: {e}")
+    ClientMCPManager = get_mcp_manager_cls()
+    if ClientMCPManager is None:
         return tools_list
 
     mcp_config_str = os.getenv("MCP_SERVERS", "{}")
 
     try:
-        config = json.loads(mcp_config_str)
+        config = orjson.loads(mcp_config_str)
         servers = {}
         for server in config.get("servers", []):
             servers[server["name"]] = {
                 "type": server["type"],
                 "url": server["url"],
             }
-    except (json.JSONDecodeError, KeyError) as e:
-        logger.error(f"Failed to parse MCP_SERVERS: {e}")
+    except (orjson.JSONDecodeError, KeyError) as e:
+        logger.error("Failed to parse MCP_SERVERS: %s", e)
         return tools_list
 
     if not servers:
@@ -217,22 +247,28 @@ async def _get_tools(user_context: UserContext) -> list[Any]:
         return tools_list
 
     user_scope = user_context.get("scope", [])
-    # Parse scope string if it's a string
+    # Parse scope string if it's a string, then freeze it so the
+    # scope and per-server checks below are hash lookups
     if isinstance(user_scope, str):
         user_scope = user_scope.split(" ")
-        
-    user_roles = user_context.get("roles", [])
+    user_scope = frozenset(user_scope)
+
+    user_roles = frozenset(user_context.get("roles", []))
 
     # 1. SCOPE CHECK: Must have "mutual funds"
     if "mutual funds" not in user_scope:
-         logger.warning(f"User {user_context.get('user_id')} missing required scope 'mutual funds' for NAV Agent")
+         logger.warning(
+             "User %s missing required scope 'mutual funds' for NAV Agent",
+             user_context.get("user_id"),
+         )
          return []
 
     # 2. ROLE CHECK: Must be "fundhouse" (or "admin" if we want to allow admins)
-    allowed_roles = {"fundhouse"}
-    user_role_set = set(user_roles)
-    if not user_role_set.intersection(allowed_roles):
-        logger.warning(f"User {user_context.get('user_id')} missing required role 'fundhouse' for NAV Agent")
+    if _ALLOWED_ROLES.isdisjoint(user_roles):
+        logger.warning(
+            "User %s missing required role 'fundhouse' for NAV Agent",
+            user_context.get("user_id"),
+        )
         return []
 
     for server_name, server_config in servers.items():
@@ -251,17 +287,18 @@ async def _get_tools(user_context: UserContext) -> list[Any]:
             async with ClientMCPManager(mcp_config) as mcp:
                 mcp_tools = await mcp.get_tools(server_name)
                 logger.info(
-                    f"Loaded {len(mcp_tools)} tools from {server_name} "
-                    f"(authorized for user {user_context.get('user_id')})"
+                    "Loaded %s tools from %s (authorized for user %s)",
+                    len(mcp_tools), server_name, user_context.get("user_id"),
                 )
                 tools_list.extend(mcp_tools)
         except Exception as e:
-            logger.error(f"Failed to load tools from {server_name}: {e}")
+            logger.error("Failed to load tools from %s: %s", server_name, e)
             continue
 
     return tools_list
 
 
+@lru_cache(maxsize=1024)
 def _is_write_operation(tool_name: str) -> bool:
     """Determine if a tool call represents a write operation requiring approval.
 
@@ -271,14 +308,11 @@ def _is_write_operation(tool_name: str) -> bool:
     Returns:
         True if the operation is a write/mutating operation requiring approval
     """
-    # Tools that are safe and don't require approval
-    safe_tools = ["upload_nav_file", "check_nav_service_health"]
-    if tool_name in safe_tools:
+    if tool_name in _SAFE_TOOLS:
         return False
     
     # Other write operations that require approval
-    write_keywords = ["create", "update", "delete", "add", "remove", "post", "put"]
-    return any(keyword in tool_name.lower() for keyword in write_keywords)
+    return is_write_tool_name(tool_name)
 
 
 async def call_model(
@@ -299,7 +333,6 @@ async def call_model(
         Updated state with new messages from the LLM
     """
     try:
-        from langchain_aws.chat_models import ChatBedrock
         from langchain_core.messages import AIMessage
 
         user_context = config.get("configurable", {}).get("user", {})
@@ -309,32 +342,23 @@ async def call_model(
         tools_list = await _get_tools(user_context)
 
         # Initialize Bedrock model with tools
-        model = ChatBedrock(
-            model_id=os.getenv(
-                "BEDROCK_MODEL_ID",
-                "anthropic.claude-3-5-sonnet-20241022-v2:0",
-            ),
-            region_name=os.getenv("AWS_REGION", "us-east-1"),
-            temperature=0,
-            max_tokens=4096,
-        )
+        model = get_chat_model()
 
         model_with_tools = model.bind_tools(tools_list)
 
-        # Create system message
-        system_msg = SystemMessage(content=AGENT_SYSTEM_PROMPT)
 
         # Invoke the model
-        response = model_with_tools.invoke([system_msg] + state["messages"])
+        response = await model_with_tools.ainvoke([_SYSTEM_MESSAGE] + state["messages"])
 
         logger.info(
-            f"Model response for user {user_context.get('user_id')}: "
-            f"(tool_calls: {len(response.tool_calls) if hasattr(response, 'tool_calls') and response.tool_calls else 0})"
+            "Model response for user %s: (tool_calls: %s)",
+            user_context.get("user_id"),
+            len(response.tool_calls) if hasattr(response, "tool_calls") and response.tool_calls else 0,
         )
 
         return {"messages": [response]}
     except Exception as e:
-        logger.error(f"Error in call_model: {e}")
+        logger.error("Error in call_model: %s", e)
         from langchain_core.messages import AIMessage
 
         error_response = AIMessage(
@@ -363,6 +387,20 @@ def _should_continue(state: AgentState) -> str:
     return END
 
 
+async def _invoke_tool(tool: Any, tool_args: dict[str, Any]) -> Any:
+    """Run a single tool call, decorating successful NAV uploads for the user."""
+    observation = await invoke_tool(tool, tool_args)
+
+    # For upload_nav_file, ensure we return the response as-is
+    if tool.name == "upload_nav_file" and isinstance(observation, str):
+        # If the response looks like JSON, keep it clean
+        if observation.strip().startswith("{") or observation.strip().startswith("["):
+            observation = f"✓ File uploaded successfully!\n\n{observation}"
+        elif not observation.startswith("Error"):
+            observation = f"✓ {observation}"
+    return observation
+
+
 async def handle_tool_calls(
     state: AgentState,
     config: RunnableConfig,
@@ -387,7 +425,8 @@ async def handle_tool_calls(
         return {"messages": []}
 
     tool_calls = last_message.tool_calls
-    results = []
+    results: list[ToolMessage | None] = []
+    pending = []
 
     # Initialize tools
     tools_list = await _get_tools(user_context)
@@ -399,7 +438,8 @@ async def handle_tool_calls(
         tool_args = tool_call.get("args", {})
 
         logger.info(
-            f"Processing tool call: {tool_name} for user {user_context.get('user_id')}"
+            "Processing tool call: %s for user %s",
+            tool_name, user_context.get("user_id"),
         )
 
         # Check if this is a write operation requiring approval
@@ -426,14 +466,14 @@ async def handle_tool_calls(
                     if approval_response.resume.get("args"):
                         tool_args = approval_response.resume["args"]
                     logger.info(
-                        f"Write operation approved: {tool_name} "
-                        f"(user: {user_context.get('user_id')})"
+                        "Write operation approved: %s (user: %s)",
+                        tool_name, user_context.get("user_id"),
                     )
                 else:
                     # Operation rejected
                     logger.info(
-                        f"Write operation rejected: {tool_name} "
-                        f"(user: {user_context.get('user_id')})"
+                        "Write operation rejected: %s (user: %s)",
+                        tool_name, user_context.get("user_id"),
                     )
                     results.append(
                         ToolMessage(
@@ -443,32 +483,28 @@ async def handle_tool_calls(
                     )
                     continue
 
-        # Execute the tool
-        if tool_name in tools_by_name:
-            tool = tools_by_name[tool_name]
-            try:
-                observation = await tool.ainvoke(tool_args)
-                logger.info(f"Tool execution successful: {tool_name}")
-                
-                # For upload_nav_file, ensure we return the response as-is
-                if tool_name == "upload_nav_file" and isinstance(observation, str):
-                    # If the response looks like JSON, keep it clean
-                    if observation.strip().startswith("{") or observation.strip().startswith("["):
-                        observation = f"✓ File uploaded successfully!\n\n{observation}"
-                    elif not observation.startswith("Error"):
-                        observation = f"✓ {observation}"
-            except Exception as e:
-                observation = f"Error executing tool: {str(e)}"
-                logger.error(f"Tool execution failed: {tool_name} - {str(e)}")
-        else:
-            observation = f"Tool '{tool_name}' not found in available tools"
-            logger.warning(f"Tool not found: {tool_name}")
-
-        results.append(
-            ToolMessage(
-                content=str(observation),
-                tool_call_id=tool_call["id"],
+        tool = tools_by_name.get(tool_name)
+        if tool is None:
+            logger.warning("Tool not found: %s", tool_name)
+            results.append(
+                ToolMessage(
+                    content=f"Tool '{tool_name}' not found in available tools",
+                    tool_call_id=tool_call["id"],
+                )
             )
+            continue
+
+        # Run approved calls after every approval has been collected
+        pending.append((len(results), tool, tool_args, tool_call["id"]))
+        results.append(None)
+
+    observations = await asyncio.gather(
+        *(_invoke_tool(tool, tool_args) for _, tool, tool_args, _ in pending)
+    )
+    for (slot, _, _, tool_call_id), observation in zip(pending, observations):
+        results[slot] = ToolMessage(
+            content=str(observation),
+            tool_call_id=tool_call_id,
         )
 
     return {"messages": results}
@@ -493,12 +529,14 @@ async def finalize_response(
     
     messages = state["messages"]
     
-    # Look for ToolMessages in the results
+    # Only this turn's ToolMessages, which trail the checkpointed history
     tool_results = []
-    for msg in messages:
-        if isinstance(msg, ToolMessage):
-            tool_results.append(msg.content)
-    
+    for msg in reversed(messages):
+        if not isinstance(msg, ToolMessage):
+            break
+        tool_results.append(msg.content)
+    tool_results.reverse()
+
     if tool_results:
         # Combine all tool results into a single response
         combined_response = "\n\n".join(tool_results)
@@ -522,7 +560,8 @@ async def initialize_checkpointer() -> Any:
         from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
     except ImportError as e:
         logger.warning(
-            f"PostgreSQL checkpointer not available: {e}. Using memory checkpointer."
+            "PostgreSQL checkpointer not available: %s. Using memory checkpointer.",
+            e,
         )
         from langgraph.checkpoint.memory import MemorySaver
 
@@ -540,28 +579,26 @@ async def initialize_checkpointer() -> Any:
         return checkpointer
     except Exception as e:
         logger.warning(
-            f"Failed to initialize PostgreSQL checkpointer: {e}. Using memory checkpointer."
+            "Failed to initialize PostgreSQL checkpointer: %s. Using memory checkpointer.",
+            e,
         )
         from langgraph.checkpoint.memory import MemorySaver
 
         return MemorySaver()
 
 
-async def create_agent_graph() -> StateGraph:
+def _build_graph() -> StateGraph:
     """Create and compile the agent graph.
 
     The graph follows this flow:
     1. START → call_model (LLM decides what to do)
     2. call_model → should_continue (Check if tools were called)
-    3. handle_tool_calls → call_model (Execute tools and loop back)
-    4. → END (Model responds directly to user)
+    3. handle_tool_calls → finalize_response (Execute tools)
+    4. → END (Tool results or model reply returned to user)
 
     Returns:
-        Compiled LangGraph StateGraph with PostgreSQL persistence
+        Compiled LangGraph StateGraph
     """
-    # Initialize checkpointer
-    # checkpointer = await initialize_checkpointer()
-
     # Create state graph
     graph = StateGraph(AgentState, config_schema=Context)
 
@@ -586,7 +623,6 @@ async def create_agent_graph() -> StateGraph:
     # Final response goes to end
     graph.add_edge("finalize_response", END)
 
-    # Compile with checkpointer for persistence
     compiled_graph = graph.compile(
         name="nav-agent",
     )
@@ -595,53 +631,25 @@ async def create_agent_graph() -> StateGraph:
     return compiled_graph
 
 
-# Initialize graph at module level for use by LangGraph CLI
-
-# Lazy initialization to avoid asyncio.run() conflicts
+# Compiled once and shared by the LangGraph CLI and the router
 _graph_instance = None
 
+
 def get_graph():
+    """Get the compiled graph, building it on first use."""
     global _graph_instance
-    if _graph_instance:
-        return _graph_instance
-        
-    try:
-        current_loop = asyncio.get_running_loop()
-        logger.info("Detected running event loop, graph will be lazily initialized")
-        
-        # Re-using create_agent_graph logic synchronously where possible 
-        graph = StateGraph(AgentState, config_schema=Context)
-        graph.add_node("call_model", call_model)
-        graph.add_node("handle_tool_calls", handle_tool_calls)
-        graph.add_node("finalize_response", finalize_response)
-        graph.add_edge(START, "call_model")
-        graph.add_conditional_edges(
-            "call_model",
-            _should_continue,
-            {
-                "handle_tool_calls": "handle_tool_calls",
-                END: END,
-            },
-        )
-        graph.add_edge("handle_tool_calls", "finalize_response")
-        graph.add_edge("finalize_response", END)
-        
-        _graph_instance = graph.compile(name="nav-agent")
-        logger.info("NAV Agent graph compiled successfully")
-        return _graph_instance
-        
-    except RuntimeError:
-        # No running event loop (e.g. CLI usage), safe to run async setup
-        return asyncio.run(create_agent_graph())
-
-# For backward compatibility with LangGraph CLI
-if __name__ == "__main__":
-    graph = asyncio.run(create_agent_graph())
-else:
-    # When imported, try to get graph if safe, otherwise rely on get_graph()
-    try:
-        asyncio.get_running_loop()
-        # Don't init yet, let router call get_graph()
-        graph = None 
-    except RuntimeError:
-        graph = asyncio.run(create_agent_graph())
+    if _graph_instance is None:
+        _graph_instance = _build_graph()
+    return _graph_instance
+
+
+async def create_agent_graph() -> StateGraph:
+    """Create and compile the agent graph.
+
+    Returns:
+        Compiled LangGraph StateGraph (shared with get_graph)
+    """
+    return get_graph()
+
+
+graph = get_graph()
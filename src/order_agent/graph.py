@@ -12,19 +12,26 @@ This agent integrates with order management APIs, featuring:
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
 import os
+from functools import lru_cache
+from pathlib import Path
 from typing import Any
 
 import httpx
+import orjson
 from langchain.tools import tool
 from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph, add_messages
 from langgraph.types import Command, interrupt
 from typing_extensions import Annotated, TypedDict
-from utils.bedrock_messages import sanitize_for_bedrock
+
+from src.utils.bedrock import get_chat_model
+from src.utils.bedrock_messages import sanitize_for_bedrock
+from src.utils.tools import get_mcp_manager_cls, invoke_tool
+from src.utils.tools import is_write_tool_name as _is_write_operation
+
 # Configure logging
 logger = logging.getLogger(__name__)
 logger.setLevel(os.getenv("AGENT_LOG_LEVEL", "INFO"))
@@ -71,14 +78,55 @@ Guidelines:
 - For file uploads, confirm the file details before processing
 """
 
+_SYSTEM_MESSAGE = SystemMessage(content=AGENT_SYSTEM_PROMPT)
+
 
 def _get_api_base_url() -> str:
     """Get the order API base URL from environment."""
     return os.getenv("ORDER_API_BASE_URL", "http://localhost:8082")
 
 
+# Pooled client for the upload API, created on first use inside the event loop
+_http_client: httpx.AsyncClient | None = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the pooled upload client; called when the server shuts down."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# Files larger than this are read for every upload rather than cached
+UPLOAD_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+@lru_cache(maxsize=16)
+def _read_upload(file_path: str, mtime_ns: int, size: int) -> bytes:
+    """Read an upload file, cached per (path, mtime, size) so a rewrite is reread."""
+    return Path(file_path).read_bytes()
+
+
+def _load_upload(file_path: str) -> bytes:
+    """Return the bytes to upload, reusing the last read if the file is unchanged."""
+    stat = os.stat(file_path)
+    if stat.st_size > UPLOAD_CACHE_MAX_BYTES:
+        return Path(file_path).read_bytes()
+    return _read_upload(file_path, stat.st_mtime_ns, stat.st_size)
+
+
 @tool
-def upload_order_file(file_path: str, key: str | None = None) -> str:
+async def upload_order_file(file_path: str, key: str | None = None) -> str:
     """Upload a file to S3 via the order API.
 
     This tool handles file uploads that cannot be passed through MCP.
@@ -92,43 +140,45 @@ def upload_order_file(file_path: str, key: str | None = None) -> str:
         Upload result from the API
     """
     try:
-        if not os.path.exists(file_path):
-            return f"Error: File not found at {file_path}"
-
-        with open(file_path, "rb") as f:
-            file_content = f.read()
-
         file_name = os.path.basename(file_path)
-        files = {"file": (file_name, file_content)}
         params = {}
         if key:
             params["key"] = key
 
         api_url = _get_api_base_url()
-        response = httpx.post(
+        # httpx reads file objects synchronously, so load the file in a worker
+        # thread rather than blocking the event loop on disk I/O
+        file_content = await asyncio.to_thread(_load_upload, file_path)
+        response = await _get_http_client().post(
             f"{api_url}/order/upload",
-            files=files,
+            files={"file": (file_name, file_content)},
             params=params,
             timeout=30.0,
         )
 
         if response.status_code == 200:
-            result = response.json()
             logger.info(
-                f"File uploaded successfully: {file_name} "
-                f"(user: {os.getenv('CURRENT_USER_ID', 'unknown')})"
+                "File uploaded successfully: %s (user: %s)",
+                file_name, os.getenv("CURRENT_USER_ID", "unknown"),
             )
-            return json.dumps(result)
+            # The API already returns JSON; hand it back without a decode/encode round trip
+            return response.text
         else:
             error_msg = f"Upload failed with status {response.status_code}"
-            logger.error(f"{error_msg}: {response.text}")
+            logger.error("%s: %s", error_msg, response.text)
             return f"Error: {error_msg}. Details: {response.text}"
 
+    except FileNotFoundError:
+        return f"Error: File not found at {file_path}"
     except Exception as e:
-        logger.error(f"File upload error: {str(e)}")
+        logger.error("File upload error: %s", e)
         return f"Error uploading file: {str(e)}"
 
 
+# Roles permitted to use the order agent's tools
+_ALLOWED_ROLES = frozenset({"distributor", "admin"})
+
+
 async def _get_tools(user_context: UserContext) -> list[Any]:
     """Initialize and retrieve tools for order agent.
 
@@ -143,24 +193,22 @@ async def _get_tools(user_context: UserContext) -> list[Any]:
     """
     tools_list = [upload_order_file]
 
-    try:
-        from langchain_mcp_adapters import ClientMCPManager
-    except ImportError as e:
-        logger.warning(f"langchain-mcp-adapters not installed: {e}")
+    ClientMCPManager = get_mcp_manager_cls()
+    if ClientMCPManager is None:
         return tools_list
 
     mcp_config_str = os.getenv("MCP_SERVERS", "{}")
 
     try:
-        config = json.loads(mcp_config_str)
+        config = orjson.loads(mcp_config_str)
         servers = {}
         for server in config.get("servers", []):
             servers[server["name"]] = {
                 "type": server["type"],
                 "url": server["url"],
             }
-    except (json.JSONDecodeError, KeyError) as e:
-        logger.error(f"Failed to parse MCP_SERVERS: {e}")
+    except (orjson.JSONDecodeError, KeyError) as e:
+        logger.error("Failed to parse MCP_SERVERS: %s", e)
         return tools_list
 
     if not servers:
@@ -168,22 +216,28 @@ async def _get_tools(user_context: UserContext) -> list[Any]:
         return tools_list
 
     user_scope = user_context.get("scope", [])
-    # Parse scope string if it's a string (e.g. from Keycloak)
+    # Parse scope string if it's a string (e.g. from Keycloak), then freeze
+    # it so the scope and per-server checks below are hash lookups
     if isinstance(user_scope, str):
         user_scope = user_scope.split(" ")
-        
-    user_roles = user_context.get("roles", [])
+    user_scope = frozenset(user_scope)
+
+    user_roles = frozenset(user_context.get("roles", []))
     
     # 1. SCOPE CHECK: Must have "mutual funds" or be admin
     if "mutual funds" not in user_scope and "admin" not in user_roles:
-         logger.warning(f"User {user_context.get('user_id')} missing required scope 'mutual funds'")
+         logger.warning(
+             "User %s missing required scope 'mutual funds'",
+             user_context.get("user_id"),
+         )
          return []
 
     # 2. ROLE CHECK: Must be "distributor" or "admin"
-    allowed_roles = {"distributor", "admin"}
-    user_role_set = set(user_roles)
-    if not user_role_set.intersection(allowed_roles):
-        logger.warning(f"User {user_context.get('user_id')} missing required role (distributor/admin)")
+    if _ALLOWED_ROLES.isdisjoint(user_roles):
+        logger.warning(
+            "User %s missing required role (distributor/admin)",
+            user_context.get("user_id"),
+        )
         return []
 
     for server_name, server_config in servers.items():
@@ -202,30 +256,17 @@ async def _get_tools(user_context: UserContext) -> list[Any]:
             async with ClientMCPManager(mcp_config) as mcp:
                 mcp_tools = await mcp.get_tools(server_name)
                 logger.info(
-                    f"Loaded {len(mcp_tools)} tools from {server_name} "
-                    f"(authorized for user {user_context.get('user_id')})"
+                    "Loaded %s tools from %s (authorized for user %s)",
+                    len(mcp_tools), server_name, user_context.get("user_id"),
                 )
                 tools_list.extend(mcp_tools)
         except Exception as e:
-            logger.error(f"Failed to load tools from {server_name}: {e}")
+            logger.error("Failed to load tools from %s: %s", server_name, e)
             continue
 
     return tools_list
 
 
-def _is_write_operation(tool_name: str) -> bool:
-    """Determine if a tool call represents a write operation.
-
-    Args:
-        tool_name: Name of the tool being called
-
-    Returns:
-        True if the operation is a write/mutating operation
-    """
-    write_keywords = ["create", "update", "delete", "add", "remove", "post", "put"]
-    return any(keyword in tool_name.lower() for keyword in write_keywords)
-
-
 async def call_model(
     state: AgentState,
     config: RunnableConfig,
@@ -244,7 +285,6 @@ async def call_model(
         Updated state with new messages from the LLM
     """
     try:
-        from langchain_aws.chat_models import ChatBedrock
         from langchain_core.messages import AIMessage
 
         user_context = config.get("configurable", {}).get("user", {})
@@ -252,20 +292,10 @@ async def call_model(
         tools_list = await _get_tools(user_context)
 
         # Initialize Bedrock model with tools
-        model = ChatBedrock(
-            model_id=os.getenv(
-                "BEDROCK_MODEL_ID",
-                "anthropic.claude-3-5-sonnet-20241022-v2:0",
-            ),
-            region_name=os.getenv("AWS_REGION", "us-east-1"),
-            temperature=0,
-            max_tokens=4096,
-        )
+        model = get_chat_model()
 
         model_with_tools = model.bind_tools(tools_list)
 
-        # Create system message
-        system_msg = SystemMessage(content=AGENT_SYSTEM_PROMPT)
 
         # Build messages: only add system message if not already in history
         messages = state["messages"]
@@ -278,20 +308,21 @@ async def call_model(
             message_history = messages
         else:
             # Add system message at the beginning
-            message_history = [system_msg] + messages
+            message_history = [_SYSTEM_MESSAGE] + messages
         
         
         # Invoke the model
-        response = model_with_tools.invoke(message_history)
+        response = await model_with_tools.ainvoke(message_history)
 
         logger.info(
-            f"Model response for user {user_context.get('user_id')}: "
-            f"(tool_calls: {len(response.tool_calls) if hasattr(response, 'tool_calls') and response.tool_calls else 0})"
+            "Model response for user %s: (tool_calls: %s)",
+            user_context.get("user_id"),
+            len(response.tool_calls) if hasattr(response, "tool_calls") and response.tool_calls else 0,
         )
 
         return {"messages": [response]}
     except Exception as e:
-        logger.error(f"Error in call_model: {e}")
+        logger.error("Error in call_model: %s", e)
         from langchain_core.messages import AIMessage
 
         error_response = AIMessage(
@@ -341,7 +372,8 @@ async def handle_tool_calls(
         return {"messages": []}
 
     tool_calls = last_message.tool_calls
-    results = []
+    results: list[ToolMessage | None] = []
+    pending = []
 
     try:
         # Initialize tools
@@ -354,7 +386,8 @@ async def handle_tool_calls(
             tool_args = tool_call.get("args", {})
 
             logger.info(
-                f"Processing tool call: {tool_name} for user {user_context.get('user_id')}"
+                "Processing tool call: %s for user %s",
+                tool_name, user_context.get("user_id"),
             )
 
             # Check if this is a write operation requiring approval
@@ -381,14 +414,14 @@ async def handle_tool_calls(
                         if approval_response.resume.get("args"):
                             tool_args = approval_response.resume["args"]
                         logger.info(
-                            f"Write operation approved: {tool_name} "
-                            f"(user: {user_context.get('user_id')})"
+                            "Write operation approved: %s (user: %s)",
+                            tool_name, user_context.get("user_id"),
                         )
                     else:
                         # Operation rejected
                         logger.info(
-                            f"Write operation rejected: {tool_name} "
-                            f"(user: {user_context.get('user_id')})"
+                            "Write operation rejected: %s (user: %s)",
+                            tool_name, user_context.get("user_id"),
                         )
                         results.append(
                             ToolMessage(
@@ -398,29 +431,33 @@ async def handle_tool_calls(
                         )
                         continue
 
-            # Execute the tool
-            if tool_name in tools_by_name:
-                tool = tools_by_name[tool_name]
-                try:
-                    observation = await tool.ainvoke(tool_args)
-                    logger.info(f"Tool execution successful: {tool_name}")
-                except Exception as e:
-                    observation = f"Error executing tool: {str(e)}"
-                    logger.error(f"Tool execution failed: {tool_name} - {str(e)}")
-            else:
-                observation = f"Tool '{tool_name}' not found in available tools"
-                logger.warning(f"Tool not found: {tool_name}")
-
-            results.append(
-                ToolMessage(
-                    content=str(observation),
-                    tool_call_id=tool_call["id"],
+            tool = tools_by_name.get(tool_name)
+            if tool is None:
+                logger.warning("Tool not found: %s", tool_name)
+                results.append(
+                    ToolMessage(
+                        content=f"Tool '{tool_name}' not found in available tools",
+                        tool_call_id=tool_call["id"],
+                    )
                 )
+                continue
+
+            # Run approved calls after every approval has been collected
+            pending.append((len(results), tool, tool_args, tool_call["id"]))
+            results.append(None)
+
+        observations = await asyncio.gather(
+            *(invoke_tool(tool, tool_args) for _, tool, tool_args, _ in pending)
+        )
+        for (slot, _, _, tool_call_id), observation in zip(pending, observations):
+            results[slot] = ToolMessage(
+                content=str(observation),
+                tool_call_id=tool_call_id,
             )
 
         return {"messages": results}
     except Exception as e:
-        logger.error(f"Error in handle_tool_calls: {e}")
+        logger.error("Error in handle_tool_calls: %s", e)
         return {
             "messages": [
                 ToolMessage(
@@ -444,7 +481,8 @@ async def initialize_checkpointer() -> Any:
         from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
     except ImportError as e:
         logger.warning(
-            f"PostgreSQL checkpointer not available: {e}. Using memory checkpointer."
+            "PostgreSQL checkpointer not available: %s. Using memory checkpointer.",
+            e,
         )
         from langgraph.checkpoint.memory import MemorySaver
 
@@ -462,14 +500,15 @@ async def initialize_checkpointer() -> Any:
         return checkpointer
     except Exception as e:
         logger.warning(
-            f"Failed to initialize PostgreSQL checkpointer: {e}. Using memory checkpointer."
+            "Failed to initialize PostgreSQL checkpointer: %s. Using memory checkpointer.",
+            e,
         )
         from langgraph.checkpoint.memory import MemorySaver
 
         return MemorySaver()
 
 
-async def create_agent_graph() -> StateGraph:
+def _build_graph() -> StateGraph:
     """Create and compile the agent graph.
 
     The graph follows this flow:
@@ -512,81 +551,24 @@ async def create_agent_graph() -> StateGraph:
     return compiled_graph
 
 
-# Lazy initialization for module-level graph
-_graph = None
-_graph_lock = asyncio.Lock() if asyncio.iscoroutinefunction(asyncio.Lock) else None
+_graph_instance = None
 
 
-async def _get_or_create_graph():
-    """Get or create the graph asynchronously, handling event loop context."""
-    global _graph
-    if _graph is not None:
-        return _graph
-    
-    try:
-        _graph = await create_agent_graph()
-        logger.info("Order agent graph initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize order agent graph: {e}")
-        # Fallback: create a minimal graph for testing
-        from langgraph.checkpoint.memory import MemorySaver
-        g = StateGraph(AgentState, config_schema=Context)
-        g.add_node("call_model", call_model)
-        g.add_edge(START, "call_model")
-        _graph = g.compile(checkpointer=MemorySaver())
-    
-    return _graph
+def get_graph():
+    """Get the compiled graph, building it on first use."""
+    global _graph_instance
+    if _graph_instance is None:
+        _graph_instance = _build_graph()
+    return _graph_instance
 
 
-# Property-like accessor for lazy initialization
-class _GraphProxy:
-    """Lazy-loading proxy for the graph with async support."""
-    
-    async def ainvoke(self, *args, **kwargs):
-        global _graph
-        if _graph is None:
-            _graph = await _get_or_create_graph()
-        return await _graph.ainvoke(*args, **kwargs)
-    
-    def invoke(self, *args, **kwargs):
-        """Synchronous invoke - delegates to ainvoke in async context."""
-        global _graph
-        if _graph is None:
-            # Try to initialize synchronously (no running loop)
-            try:
-                asyncio.get_running_loop()
-                raise RuntimeError(
-                    "Cannot call invoke() from async context. Use ainvoke() instead."
-                )
-            except RuntimeError:
-                _graph = asyncio.run(_get_or_create_graph())
-        return _graph.invoke(*args, **kwargs)
-    
-    def __getattr__(self, name):
-        global _graph
-        if _graph is None:
-            # For attribute access, try to initialize
-            try:
-                asyncio.get_running_loop()
-                logger.warning(
-                    f"Graph not yet initialized, accessing {name} in async context. "
-                    "Use ainvoke() for async operations."
-                )
-            except RuntimeError:
-                _graph = asyncio.run(_get_or_create_graph())
-        return getattr(_graph, name) if _graph else None
-    
-    def __call__(self, *args, **kwargs):
-        global _graph
-        if _graph is None:
-            try:
-                asyncio.get_running_loop()
-                raise RuntimeError(
-                    "Cannot call graph from async context. Use ainvoke() instead."
-                )
-            except RuntimeError:
-                _graph = asyncio.run(_get_or_create_graph())
-        return _graph(*args, **kwargs)
+async def create_agent_graph() -> StateGraph:
+    """Create and compile the agent graph.
+
+    Returns:
+        Compiled LangGraph StateGraph (shared with get_graph)
+    """
+    return get_graph()
 
 
-graph = _GraphProxy()
+graph = get_graph()
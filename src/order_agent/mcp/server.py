@@ -1,27 +1,108 @@
+import asyncio
+import hashlib
 import json
+import tempfile
 from pathlib import Path
 
 import httpx
+import orjson
 from fastmcp import FastMCP
 
+try:
+    import uvloop
+except ImportError:  # uvloop is unavailable on Windows
+    uvloop = None
+
+# Connection pool settings shared by every backend client
+HTTP_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=30.0,
+)
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+# Downloaded specs and their HTTP validators, reused across restarts
+SPEC_CACHE_DIR = Path(tempfile.gettempdir()) / "mcp_spec_cache"
+
+
+def _spec_cache_paths(spec_link: str) -> tuple[Path, Path]:
+    digest = hashlib.sha256(spec_link.encode()).hexdigest()
+    return SPEC_CACHE_DIR / f"{digest}.json", SPEC_CACHE_DIR / f"{digest}.validators"
+
+
+async def _fetch_spec(client: httpx.AsyncClient, spec_link: str) -> dict:
+    """Download and parse a single OpenAPI specification.
+
+    The spec is revalidated with If-None-Match/If-Modified-Since and read
+    from the on-disk copy when the server answers 304 Not Modified.
+    """
+    spec_path, validators_path = _spec_cache_paths(spec_link)
+    try:
+        conditional_headers = orjson.loads(validators_path.read_bytes())
+    except (FileNotFoundError, ValueError):
+        conditional_headers = {}
+
+    response = await client.get(spec_link, headers=conditional_headers)
+    if response.status_code == 304:
+        try:
+            return orjson.loads(spec_path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            response = await client.get(spec_link)
+
+    response.raise_for_status()
+    spec = orjson.loads(response.content)
+
+    validators = {
+        header: response.headers[source]
+        for header, source in (
+            ("If-None-Match", "ETag"),
+            ("If-Modified-Since", "Last-Modified"),
+        )
+        if source in response.headers
+    }
+    if validators:
+        SPEC_CACHE_DIR.mkdir(exist_ok=True)
+        spec_path.write_bytes(response.content)
+        validators_path.write_bytes(orjson.dumps(validators))
+    return spec
+
+
+async def fetch_specs(spec_links: list[str]) -> list[dict | BaseException]:
+    """Download all OpenAPI specifications concurrently.
+
+    Args:
+        spec_links: URLs of the OpenAPI specifications
+
+    Returns:
+        Parsed specs in the same order, or the exception raised for each failed fetch
+    """
+    async with httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT) as client:
+        return await asyncio.gather(
+            *(_fetch_spec(client, link) for link in spec_links),
+            return_exceptions=True,
+        )
+
 
 def setup_fastmcp_server_from_openapi_spec(
-    spec_link: str,
+    open_api_spec: dict,
     base_url: str,
     server_name: str,
 ) -> FastMCP:
     """Create a FastMCP server from an OpenAPI specification.
 
     Args:
-        spec_link: URL to the OpenAPI specification
+        open_api_spec: Parsed OpenAPI specification
         base_url: Base URL for the API
         server_name: Name of the MCP server
 
     Returns:
         Configured FastMCP instance
     """
-    open_api_spec = httpx.get(spec_link).json()
-    client = httpx.AsyncClient(base_url=base_url)
+    client = httpx.AsyncClient(
+        base_url=base_url,
+        limits=HTTP_LIMITS,
+        timeout=HTTP_TIMEOUT,
+    )
     return FastMCP.from_openapi(
         openapi_spec=open_api_spec,
         client=client,
@@ -48,23 +129,23 @@ def load_config(config_path: str = "order_agent_servers_config.json") -> dict:
     return config
 
 
-def start_server(server_config: dict) -> FastMCP:
-    """Start a single MCP server in a separate thread.
+def start_server(server_config: dict, open_api_spec: dict | BaseException) -> FastMCP | None:
+    """Build a single MCP server from its prefetched OpenAPI spec, or None if it failed.
 
     Args:
         server_config: Configuration dictionary for the server
+        open_api_spec: Parsed spec, or the exception raised while fetching it
     """
     server_name = server_config.get("server_name")
-    spec_link = server_config.get("spec_link")
     base_url = server_config.get("base_url")
 
-    if not all([server_name, spec_link, base_url]):
-        print(f"Skipping incomplete server config: {server_config}")
+    if isinstance(open_api_spec, BaseException):
+        print(f"Failed to start {server_name}: {str(open_api_spec)}")
         return
 
     try:
         mcp_server = setup_fastmcp_server_from_openapi_spec(
-            spec_link=spec_link,
+            open_api_spec=open_api_spec,
             base_url=base_url,
             server_name=server_name,
         )
@@ -73,6 +154,29 @@ def start_server(server_config: dict) -> FastMCP:
         print(f"Failed to start {server_name}: {str(e)}")
 
 
+def _is_complete(server_config: dict) -> bool:
+    if all(server_config.get(k) for k in ("server_name", "spec_link", "base_url")):
+        return True
+    print(f"Skipping incomplete server config: {server_config}")
+    return False
+
+
+async def serve(config: dict) -> None:
+    """Build the mounted servers and serve them on a single event loop.
+
+    Args:
+        config: Loaded server configuration
+    """
+    main_server = FastMCP("Main MCP Server")
+    server_configs = [c for c in config.get("servers") if _is_complete(c)]
+    specs = await fetch_specs([c["spec_link"] for c in server_configs])
+    for server_config, open_api_spec in zip(server_configs, specs):
+        # A server whose spec could not be fetched or parsed is left out
+        if (mcp_server := start_server(server_config, open_api_spec)) is not None:
+            main_server.mount(mcp_server)
+    await main_server.run_async(host="0.0.0.0", port=8001, transport="streamable-http")
+
+
 def main():
     """Entry point for the MCP servers!"""
     try:
@@ -80,10 +184,9 @@ def main():
         config = load_config("server_config.json")
 
         # Run main server
-        main_server = FastMCP("Main MCP Server")
-        for server_config in config.get("servers"):
-            main_server.mount(start_server(server_config))
-        main_server.run(host="0.0.0.0", port=8001, transport="streamable-http")
+        if uvloop is not None:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        asyncio.run(serve(config))
     except FileNotFoundError as e:
         print(f"Error: {str(e)}")
     except KeyboardInterrupt as ke:
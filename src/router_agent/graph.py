@@ -14,12 +14,17 @@ This router agent classifies user queries and routes them to specialized subagen
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import logging
 import operator
 import os
+import re
+import time
 import uuid
+from collections import Counter, OrderedDict
 from functools import partial
-from typing import Any
+from itertools import chain, islice
+from typing import TYPE_CHECKING, Any
 
 from langchain_core.messages import (
     AIMessage,
@@ -33,6 +38,11 @@ from langgraph.graph import END, START, StateGraph
 from langgraph.store.base import BaseStore
 from typing_extensions import Annotated, TypedDict
 
+from src.utils.bedrock import get_chat_model
+
+if TYPE_CHECKING:
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
 
 logger = logging.getLogger(__name__)
 logger.setLevel(os.getenv("AGENT_LOG_LEVEL", "INFO"))
@@ -63,10 +73,6 @@ class RouterState(TypedDict):
     order_result: Annotated[str, "Order agent result"]
     nav_result: Annotated[str, "NAV agent result"]
 
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
-
-
-
 
 ROUTER_SYSTEM_PROMPT = """You are a query router agent. Your job is to classify user queries and route them to the appropriate specialized agents.
 
@@ -92,40 +98,147 @@ REASON: <brief explanation>
 
 SYNTHESIZER_SYSTEM_PROMPT = """You are a response synthesizer. Your job is to combine results from multiple agents into a coherent, helpful response."""
 
+_ROUTER_SYSTEM_MESSAGE = SystemMessage(content=ROUTER_SYSTEM_PROMPT)
+_SYNTHESIZER_SYSTEM_MESSAGE = SystemMessage(content=SYNTHESIZER_SYSTEM_PROMPT)
+
+# Tolerates markdown emphasis and trailing punctuation around the decision
+_ROUTE_RE = re.compile(r"ROUTE:\W*(order|nav|general)\b", re.IGNORECASE)
+
+
+def _parse_route_decision(response_content: str | list) -> str | None:
+    """Extract the routing decision from the classifier's reply, or None if it has none."""
+
+    if isinstance(response_content, list):
+        response_content = "".join(
+            block.get("text", "") if isinstance(block, dict) else str(block)
+            for block in response_content
+        )
+
+    match = _ROUTE_RE.search(response_content)
+    if not match:
+        return None
+    return match.group(1).lower()
+
+
+# Anything mentioning uploads, files, orders or NAV may belong to the
+# order/NAV agents (see ROUTER_SYSTEM_PROMPT), so only queries with none of
+# these hints are routed to the general agent without asking the model
+_SPECIALIST_HINT_RE = re.compile(
+    r"upload|\bfiles?\b|\border|\bnavs?\b|ingest|\.(?:csv|json|txt|xlsx?)\b",
+    re.IGNORECASE,
+)
+
+
+def _fast_route(text: str) -> str | None:
+    """Return a routing decision for unambiguous queries, or None to ask the model."""
+    if _SPECIALIST_HINT_RE.search(text):
+        return None
+    return "general"
+
+
+# Routing decisions for recently seen queries: key digest -> (expiry, route)
+ROUTE_CACHE_ENABLED = os.getenv("ROUTER_CACHE_ENABLED", "true").lower() not in ("0", "false")
+ROUTE_CACHE_TTL = 3600
+ROUTE_CACHE_MAXSIZE = 10_000
+
+_route_cache: OrderedDict[bytes, tuple[float, str]] = OrderedDict()
+_route_cache_stats: Counter[str] = Counter()
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize_query(text: str) -> str:
+    """Lower-case the query and collapse whitespace for cache lookups."""
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+def _route_cache_key(text: str) -> bytes | None:
+    """Return a fixed-size digest of the normalized query, or None if it is blank."""
+    normalized = _normalize_query(text)
+    if not normalized:
+        return None
+    return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+
+
+def _get_cached_route(key: bytes) -> str | None:
+    entry = _route_cache.get(key)
+    if entry is None:
+        _route_cache_stats["misses"] += 1
+        return None
+    expires_at, route = entry
+    if expires_at < time.monotonic():
+        del _route_cache[key]
+        _route_cache_stats["misses"] += 1
+        return None
+    _route_cache.move_to_end(key)
+    _route_cache_stats["hits"] += 1
+    return route
+
+
+def route_cache_info() -> dict[str, int]:
+    """Return hit/miss counts and the current size of the route cache."""
+    return {
+        "hits": _route_cache_stats["hits"],
+        "misses": _route_cache_stats["misses"],
+        "size": len(_route_cache),
+    }
+
+
+def _cache_route(key: bytes, route: str) -> None:
+    _route_cache[key] = (time.monotonic() + ROUTE_CACHE_TTL, route)
+    _route_cache.move_to_end(key)
+    if len(_route_cache) > ROUTE_CACHE_MAXSIZE:
+        _route_cache.popitem(last=False)
+
+
+# Subagents keep no history of their own, so each call replays the user's
+# turns; only the latest ones are sent to bound prompt size on long threads
+SUBAGENT_HISTORY_TURNS = 10
+
+
+def _recent_user_messages(state: RouterState) -> list[HumanMessage]:
+    """Return the last SUBAGENT_HISTORY_TURNS user messages, oldest first."""
+    recent = list(islice(
+        (m for m in reversed(state.get("messages", [])) if isinstance(m, HumanMessage)),
+        SUBAGENT_HISTORY_TURNS,
+    ))
+    recent.reverse()
+    return recent
+
+
+# Roles allowed to reach each subagent
+_AGENT_ROLES: dict[str, frozenset[str]] = {
+    "order": frozenset({"admin", "distributor"}),
+    "nav": frozenset({"admin", "fundhouse"}),
+    "mcp": frozenset({"admin", "distributor", "fundhouse"}),
+}
+
 
 def _check_agent_access(user_context: UserContext, agent_name: str) -> tuple[bool, str]:
     """RBAC enforcement for subagents."""
 
-    user_role = user_context.get("role", "").lower()
-    user_roles = [r.lower() for r in user_context.get("roles", [])] if user_context.get("roles") else []
-    all_roles = {user_role} | set(user_roles)
-    all_roles.discard("")
+    all_roles = {
+        role.lower()
+        for role in chain((user_context.get("role", ""),), user_context.get("roles") or ())
+        if role
+    }
 
     logger.info(
-        f"[RBAC] Checking access: agent={agent_name}, "
-        f"user_id={user_context.get('user_id')}, roles={all_roles}"
+        "[RBAC] Checking access: agent=%s, user_id=%s, roles=%s",
+        agent_name, user_context.get("user_id"), all_roles,
     )
 
-    if agent_name == "order":
-        if "admin" in all_roles or "distributor" in all_roles:
-            return True, "Authorized"
-        return False, "Access denied."
-
-    if agent_name == "nav":
-        if "admin" in all_roles or "fundhouse" in all_roles:
-            return True, "Authorized"  
-        return False, "Access denied."
+    allowed_roles = _AGENT_ROLES.get(agent_name)
+    if allowed_roles is not None:
+        if allowed_roles.isdisjoint(all_roles):
+            return False, "Access denied."
+        return True, "Authorized"
 
-    if agent_name == "mcp":
-        if all_roles & {"admin", "distributor", "fundhouse"}:
-            return True, "Authorized"
-        return False, "Access denied."
-
-    logger.warning(f"[RBAC] Unknown agent: {agent_name}")
+    logger.warning("[RBAC] Unknown agent: %s", agent_name)
     return False, "Unknown agent."
 
 
-def _save_agent_interaction(
+async def _save_agent_interaction(
     store: BaseStore,
     config: RunnableConfig,
     agent_name: str,
@@ -141,7 +254,9 @@ def _save_agent_interaction(
         user_id = user_context["user_id"]
         namespace = ("user", user_id, "interactions")
 
-        store.put(
+        # The Postgres store is synchronous; keep its round trip off the event loop
+        await asyncio.to_thread(
+            store.put,
             namespace,
             str(uuid.uuid4()),
             {
@@ -150,35 +265,80 @@ def _save_agent_interaction(
             },
         )
 
-        logger.debug(f"[MEMORY] Stored {agent_name} interaction for {user_id}")
+        logger.debug("[MEMORY] Stored %s interaction for %s", agent_name, user_id)
 
     except Exception as e:
-        logger.error(f"[MEMORY] Failed to store interaction: {e}")
+        logger.error("[MEMORY] Failed to store interaction: %s", e)
+
 
 
+# Compiled subagent graphs, loaded on first use
+_subagent_graphs: dict[str, Any] = {}
+
 
 async def _load_subagent(agent_name: str) -> Any:
     """Dynamically load a subagent graph."""
 
+    graph = _subagent_graphs.get(agent_name)
+    if graph is not None:
+        return graph
+
     try:
         if agent_name == "order":
-            from src.order_agent.graph import graph as order_graph
-            return order_graph
+            import src.order_agent.graph as order_module
+            graph = order_module.get_graph()
 
         elif agent_name == "nav":
             import src.nav_agent.graph as nav_module
-            return nav_module.get_graph()
+            graph = nav_module.get_graph()
 
         elif agent_name == "mcp":
             import src.agent.graph as mcp_module
-            return await mcp_module.get_graph()
+            graph = mcp_module.get_graph()
 
-        raise ValueError(f"Unknown agent: {agent_name}")
+        else:
+            raise ValueError(f"Unknown agent: {agent_name}")
 
     except Exception as e:
-        logger.error(f"Failed to load subagent {agent_name}: {e}")
+        logger.error("Failed to load subagent %s: %s", agent_name, e)
         raise
 
+    _subagent_graphs[agent_name] = graph
+    return graph
+
+
+# Seconds the classifier may take before the query falls back to "general"
+ROUTER_TIMEOUT_S = float(os.getenv("ROUTER_TIMEOUT_S", "15"))
+
+
+async def _run_classifier(user_message: HumanMessage) -> str | None:
+    """Ask the classifier model for a routing decision."""
+    model = get_chat_model(max_tokens=256)
+
+    response = await asyncio.wait_for(
+        model.ainvoke([_ROUTER_SYSTEM_MESSAGE, user_message]),
+        timeout=ROUTER_TIMEOUT_S,
+    )
+
+    response_text = response.content
+    logger.debug("[ROUTER] Raw classifier response: %s", response_text)
+
+    return _parse_route_decision(response_text)
+
+
+# Classifier calls in flight, keyed like the route cache
+_inflight_routes: dict[bytes, asyncio.Future[str | None]] = {}
+
+
+async def _classify_shared(cache_key: bytes, user_message: HumanMessage) -> str | None:
+    """Classify a query, sharing one model call between identical concurrent queries."""
+    task = _inflight_routes.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_run_classifier(user_message))
+        _inflight_routes[cache_key] = task
+        task.add_done_callback(lambda _: _inflight_routes.pop(cache_key, None))
+    return await asyncio.shield(task)
+
 
 async def classify_query(
     state: RouterState,
@@ -187,25 +347,23 @@ async def classify_query(
     """Classify the user query and determine routing."""
 
     try:
-        from langchain_aws.chat_models import ChatBedrock
-
-        logger.info("[ROUTER] classify_query() called")
-        logger.info(f"[ROUTER] Config keys: {list(config.keys())}")
+        logger.debug("[ROUTER] classify_query() called")
+        logger.debug("[ROUTER] Config keys: %s", list(config))
 
         configurable = config.get("configurable", {})
         user_context = configurable.get("user", {})
 
-        logger.info(f"[ROUTER] User context received: {user_context}")
+        logger.debug("[ROUTER] User context received: %s", user_context)
 
         messages = state.get("messages", [])
-        logger.info(f"[ROUTER] Total messages in state: {len(messages)}")
+        logger.debug("[ROUTER] Total messages in state: %d", len(messages))
 
         user_message = None
         for msg in reversed(messages):
             if isinstance(msg, HumanMessage):
                 user_message = msg
-                logger.info(
-                    f"[ROUTER] Latest user message: {msg.content[:200]}"
+                logger.debug(
+                    "[ROUTER] Latest user message: %.200s", msg.content
                 )
                 break
 
@@ -213,40 +371,45 @@ async def classify_query(
             logger.warning("[ROUTER] No HumanMessage found. Defaulting to general.")
             return {"route_decision": "general"}
 
-        model = ChatBedrock(
-            model_id=os.getenv(
-                "BEDROCK_MODEL_ID",
-                "anthropic.claude-3-5-sonnet-20241022-v2:0",
-            ),
-            region_name=os.getenv("AWS_REGION", "us-east-1"),
-            temperature=0,
-            max_tokens=256,
-        )
-
-        system_msg = SystemMessage(content=ROUTER_SYSTEM_PROMPT)
-        response = model.invoke([system_msg, user_message])
-
-        response_text = response.content
-        logger.info(f"[ROUTER] Raw classifier response: {response_text}")
-
-        route_decision = "general"
-        if "ROUTE:" in response_text:
-            try:
-                route_line = [
-                    line for line in response_text.split("\n")
-                    if "ROUTE:" in line
-                ][0]
-                route_decision = (
-                    route_line.split("ROUTE:")[1].strip().lower()
+        if isinstance(user_message.content, str):
+            fast_route = _fast_route(user_message.content)
+            if fast_route is not None:
+                logger.info(
+                    "[ROUTER] Rule-based route decision='%s' user=%s",
+                    fast_route, user_context.get("user_id"),
                 )
-            except Exception as parse_error:
-                logger.warning(
-                    f"[ROUTER] Failed parsing route: {parse_error}"
+                return {"route_decision": fast_route}
+
+        cache_key = (
+            _route_cache_key(user_message.content)
+            if ROUTE_CACHE_ENABLED and isinstance(user_message.content, str)
+            else None
+        )
+        if cache_key:
+            cached_route = _get_cached_route(cache_key)
+            if cached_route is not None:
+                logger.info(
+                    "[ROUTER] Cached route decision='%s' user=%s",
+                    cached_route, user_context.get("user_id"),
                 )
+                return {"route_decision": cached_route}
+            logger.debug("[ROUTER] Route cache miss: %s", route_cache_info())
+
+        if cache_key:
+            route_decision = await _classify_shared(cache_key, user_message)
+        else:
+            route_decision = await _run_classifier(user_message)
+
+        if route_decision is None:
+            # Left uncached so the next identical query asks the model again
+            logger.warning("[ROUTER] No ROUTE in classifier reply. Defaulting to general.")
+            route_decision = "general"
+        elif cache_key:
+            _cache_route(cache_key, route_decision)
 
         logger.info(
-            f"[ROUTER] Final route decision='{route_decision}' "
-            f"user={user_context.get('user_id')}"
+            "[ROUTER] Final route decision='%s' user=%s",
+            route_decision, user_context.get("user_id"),
         )
 
         return {"route_decision": route_decision}
@@ -269,7 +432,7 @@ async def invoke_order_agent(
         logger.info("[ROUTER→ORDER] Invoking order agent")
 
         user_context = config.get("configurable", {}).get("user", {})
-        logger.info(f"[ROUTER→ORDER] User context: {user_context}")
+        logger.debug("[ROUTER→ORDER] User context: %s", user_context)
 
         authorized, msg = _check_agent_access(user_context, "order")
         if not authorized:
@@ -281,10 +444,7 @@ async def invoke_order_agent(
 
         order_graph = await _load_subagent("order")
 
-        messages = [
-    m for m in state.get("messages", [])
-    if isinstance(m, HumanMessage)
-]
+        messages = _recent_user_messages(state)
         order_state = {"messages": messages}
 
         order_config = {
@@ -304,11 +464,11 @@ async def invoke_order_agent(
                     break
 
         logger.info(
-            f"[ROUTER→ORDER] Completed. Output: "
-            f"{final_message[:200] if final_message else 'EMPTY'}"
+            "[ROUTER→ORDER] Completed. Output: %.200s",
+            final_message or "EMPTY",
         )
 
-        _save_agent_interaction(
+        await _save_agent_interaction(
             store, config, "order", final_message
         )
 
@@ -340,7 +500,7 @@ async def invoke_nav_agent(
         logger.info("[ROUTER→NAV] Invoking NAV agent")
 
         user_context = config.get("configurable", {}).get("user", {})
-        logger.info(f"[ROUTER→NAV] User context: {user_context}")
+        logger.debug("[ROUTER→NAV] User context: %s", user_context)
 
         authorized, msg = _check_agent_access(user_context, "nav")
         if not authorized:
@@ -352,10 +512,7 @@ async def invoke_nav_agent(
 
         nav_graph = await _load_subagent("nav")
 
-        messages = [
-    m for m in state.get("messages", [])
-    if isinstance(m, HumanMessage)
-]
+        messages = _recent_user_messages(state)
         nav_state = {"messages": messages}
 
         nav_config = {
@@ -382,11 +539,11 @@ async def invoke_nav_agent(
                         break
 
         logger.info(
-            f"[ROUTER→NAV] Completed. Output: "
-            f"{final_message[:200] if final_message else 'EMPTY'}"
+            "[ROUTER→NAV] Completed. Output: %.200s",
+            final_message or "EMPTY",
         )
 
-        _save_agent_interaction(
+        await _save_agent_interaction(
             store, config, "nav", final_message
         )
 
@@ -418,7 +575,7 @@ async def invoke_mcp_agent(
         logger.info("[ROUTER→MCP] Invoking MCP agent")
 
         user_context = config.get("configurable", {}).get("user", {})
-        logger.info(f"[ROUTER→MCP] User context: {user_context}")
+        logger.debug("[ROUTER→MCP] User context: %s", user_context)
 
         authorized, msg = _check_agent_access(user_context, "mcp")
         if not authorized:
@@ -429,10 +586,7 @@ async def invoke_mcp_agent(
 
         mcp_graph = await _load_subagent("mcp")
 
-        messages = [
-    m for m in state.get("messages", [])
-    if isinstance(m, HumanMessage)
-]
+        messages = _recent_user_messages(state)
         mcp_state = {"messages": messages}
 
         mcp_config = {
@@ -452,11 +606,11 @@ async def invoke_mcp_agent(
                     break
 
         logger.info(
-            f"[ROUTER→MCP] Completed. Output: "
-            f"{final_message[:200] if final_message else 'EMPTY'}"
+            "[ROUTER→MCP] Completed. Output: %.200s",
+            final_message or "EMPTY",
         )
 
-        _save_agent_interaction(
+        await _save_agent_interaction(
             store, config, "mcp", final_message
         )
 
@@ -482,13 +636,11 @@ async def synthesize_results(
     """Synthesize results from Order/NAV agents into a final response."""
 
     try:
-        from langchain_aws.chat_models import ChatBedrock
-
         logger.info("[ROUTER→SYNTHESIZE] Synthesizing results")
 
         user_context = config.get("configurable", {}).get("user", {})
         logger.info(
-            f"[ROUTER→SYNTHESIZE] User: {user_context.get('user_id')}"
+            "[ROUTER→SYNTHESIZE] User: %s", user_context.get("user_id")
         )
 
         results = []
@@ -509,22 +661,14 @@ async def synthesize_results(
 
         if not user_message:
             combined = "\n\n".join(results)
-            _save_agent_interaction(
+            await _save_agent_interaction(
                 store, config, "synthesis", combined
             )
             return {
                 "messages": [AIMessage(content=combined)]
             }
 
-        model = ChatBedrock(
-            model_id=os.getenv(
-                "BEDROCK_MODEL_ID",
-                "anthropic.claude-3-5-sonnet-20241022-v2:0",
-            ),
-            region_name=os.getenv("AWS_REGION", "us-east-1"),
-            temperature=0,
-            max_tokens=2048,
-        )
+        model = get_chat_model(max_tokens=2048)
 
         synthesis_prompt = f"""
 Original user query:
@@ -536,12 +680,11 @@ Agent Results:
 Please synthesize these results into a clear, helpful response.
 """
 
-        system_msg = SystemMessage(content=SYNTHESIZER_SYSTEM_PROMPT)
-        response = model.invoke(
-            [system_msg, HumanMessage(content=synthesis_prompt)]
+        response = await model.ainvoke(
+            [_SYNTHESIZER_SYSTEM_MESSAGE, HumanMessage(content=synthesis_prompt)]
         )
 
-        _save_agent_interaction(
+        await _save_agent_interaction(
             store, config, "synthesis", response.content
         )
 
@@ -570,7 +713,7 @@ def _should_continue(state: RouterState) -> str:
         .strip()
     )
 
-    logger.debug(f"[ROUTER] Routing decision: {route_decision}")
+    logger.debug("[ROUTER] Routing decision: %s", route_decision)
 
     if route_decision == "order":
         return "order_agent"
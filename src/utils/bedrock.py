@@ -0,0 +1,37 @@
+"""Shared AWS Bedrock chat model for every agent graph."""
+
+import os
+from functools import lru_cache
+from typing import Any
+
+
+@lru_cache(maxsize=8)
+def get_chat_model(max_tokens: int = 4096, system: str | None = None) -> Any:
+    """Return a shared Bedrock chat model so its boto3 client and connections are reused.
+
+    Args:
+        max_tokens: Completion limit for the model
+        system: Optional system prompt sent with every request
+
+    Returns:
+        A ChatBedrock instance, cached per (max_tokens, system)
+    """
+    from botocore.config import Config
+    from langchain_aws.chat_models import ChatBedrock
+
+    model_kwargs = {"system": system} if system is not None else {}
+    return ChatBedrock(
+        model_id=os.getenv(
+            "BEDROCK_MODEL_ID",
+            "anthropic.claude-3-5-sonnet-20241022-v2:0",
+        ),
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+        temperature=0,
+        max_tokens=max_tokens,
+        model_kwargs=model_kwargs,
+        config=Config(
+            max_pool_connections=50,
+            tcp_keepalive=True,
+            retries={"max_attempts": 3, "mode": "adaptive"},
+        ),
+    )
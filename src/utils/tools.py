@@ -0,0 +1,63 @@
+"""Tool helpers shared by the agent graphs."""
+
+import asyncio
+import logging
+import re
+from collections.abc import Callable
+from functools import lru_cache
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Tool names containing any of these verbs are treated as writes
+_WRITE_KEYWORDS_RE = re.compile(
+    "create|update|delete|add|remove|post|put", re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=1024)
+def is_write_tool_name(tool_name: str) -> bool:
+    """Return True if the tool name looks like a write/mutating operation."""
+    return _WRITE_KEYWORDS_RE.search(tool_name) is not None
+
+
+@lru_cache(maxsize=1)
+def get_mcp_manager_cls() -> Any:
+    """Import the MCP adapter once; a failed import is not retried every turn."""
+    try:
+        from langchain_mcp_adapters import ClientMCPManager
+    except ImportError as e:
+        logger.warning("langchain-mcp-adapters not installed: %s", e)
+        return None
+    return ClientMCPManager
+
+
+async def invoke_tool(
+    tool: Any,
+    tool_args: dict[str, Any],
+    timeout: float | None = None,
+    on_error: Callable[[Exception], None] | None = None,
+) -> Any:
+    """Run a single tool call, returning the error text if it fails.
+
+    Args:
+        tool: LangChain tool to run
+        tool_args: Arguments from the model's tool call
+        timeout: Seconds to wait before giving up, or None to wait forever
+        on_error: Called with the exception before the error text is returned
+
+    Returns:
+        The tool's observation, or an "Error executing tool" message
+    """
+    try:
+        observation = await asyncio.wait_for(tool.ainvoke(tool_args), timeout=timeout)
+    except Exception as e:
+        if on_error is not None:
+            on_error(e)
+        if timeout is not None and isinstance(e, asyncio.TimeoutError):
+            logger.error("Tool execution timed out after %ss: %s", timeout, tool.name)
+            return f"Error executing tool: timed out after {timeout:g}s"
+        logger.error("Tool execution failed: %s - %s", tool.name, e)
+        return f"Error executing tool: {str(e)}"
+    logger.info("Tool execution successful: %s", tool.name)
+    return observation
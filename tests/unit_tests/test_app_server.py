@@ -0,0 +1,140 @@
+"""Unit tests for the API server's chat replay cache and uploads."""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import app_server
+
+USER = {"user_id": "u1", "roles": ["distributor"], "scope": ["MutualFunds"]}
+USER_HEADERS = {
+    "X-User-Id": "u1",
+    "X-User-Roles": "distributor",
+    "X-User-Scope": "MutualFunds",
+}
+
+
+@pytest.fixture
+def graph_runs(monkeypatch):
+    """Replace the graph stream with a fake that records each run."""
+    runs = []
+
+    async def fake_stream(input_message, thread_id, user_context, req):
+        runs.append(input_message)
+        yield app_server._message_line(f"answer {len(runs)}")
+
+    app_server._response_cache.clear()
+    monkeypatch.setattr(app_server, "stream_generator", fake_stream)
+    return runs
+
+
+def _replay(message="hi", user=USER, key="req-1"):
+    async def collect():
+        return [
+            line
+            async for line in app_server.cached_stream_generator(
+                message, "t1", user, None, key
+            )
+        ]
+
+    return asyncio.run(collect())
+
+
+class TestResponseCache:
+    """Test replay of completed chat streams for retried requests."""
+
+    def test_retry_with_same_key_is_replayed(self, graph_runs):
+        """Test a retry with the same idempotency key does not rerun the graph."""
+        first = _replay()
+        assert _replay() == first
+        assert len(graph_runs) == 1
+
+    def test_new_key_runs_the_graph(self, graph_runs):
+        """Test the same message under a new idempotency key is a cache miss."""
+        _replay(key="req-1")
+        _replay(key="req-2")
+        assert len(graph_runs) == 2
+
+    def test_role_change_is_not_replayed(self, graph_runs):
+        """Test a retry after the user's roles changed runs the graph again."""
+        _replay()
+        _replay(user={**USER, "roles": ["admin"]})
+        assert len(graph_runs) == 2
+
+    def test_expired_entry_runs_the_graph(self, graph_runs, monkeypatch):
+        """Test entries past the TTL are not replayed."""
+        monkeypatch.setattr(app_server, "RESPONSE_CACHE_TTL", -1)
+        _replay()
+        _replay()
+        assert len(graph_runs) == 2
+
+    def test_chat_without_key_always_runs_the_graph(self, graph_runs):
+        """Test repeated chat requests are only replayed when they carry a key."""
+        client = TestClient(app_server.app)
+        body = {"message": "list my NAV files", "thread_id": "t1"}
+
+        client.post("/api/chat", json=body, headers=USER_HEADERS)
+        client.post("/api/chat", json=body, headers=USER_HEADERS)
+        assert len(graph_runs) == 2
+
+        retry_headers = {**USER_HEADERS, app_server.IDEMPOTENCY_HEADER: "req-1"}
+        client.post("/api/chat", json=body, headers=retry_headers)
+        response = client.post("/api/chat", json=body, headers=retry_headers)
+        assert len(graph_runs) == 3
+        assert response.content == app_server._message_line("answer 3")
+
+    def test_anonymous_chat_is_not_cached(self, graph_runs):
+        """Test requests without a user context never share replayed answers."""
+        client = TestClient(app_server.app)
+        body = {"message": "hi", "thread_id": "default"}
+        headers = {app_server.IDEMPOTENCY_HEADER: "req-1"}
+
+        client.post("/api/chat", json=body, headers=headers)
+        client.post("/api/chat", json=body, headers=headers)
+        assert len(graph_runs) == 2
+
+
+class FakeGraph:
+    """Stand-in router graph that answers every upload turn."""
+
+    async def ainvoke(self, input_state, config):
+        return {"messages": []}
+
+
+class TestUploadFileName:
+    """Test uploads cannot be written outside the upload directory."""
+
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(app_server, "UPLOAD_DIR", tmp_path)
+        monkeypatch.setattr(app_server.app.state, "graph", FakeGraph(), raising=False)
+        return TestClient(app_server.app)
+
+    def _upload(self, client, file_name):
+        return client.post(
+            "/api/upload",
+            files={"file": (file_name, b"fund,nav\n")},
+            data={"thread_id": "t1"},
+            headers=USER_HEADERS,
+        )
+
+    @pytest.mark.parametrize(
+        "file_name, saved_as",
+        [("..\\x", "x"), ("a/b/c.txt", "c.txt"), ("../../etc/passwd", "passwd")],
+    )
+    def test_directory_parts_are_stripped(self, client, tmp_path, file_name, saved_as):
+        """Test only the final name component is used inside UPLOAD_DIR."""
+        response = self._upload(client, file_name)
+
+        assert response.status_code == 200
+        assert [p.name for p in tmp_path.iterdir()] == [saved_as]
+        assert (tmp_path / saved_as).read_bytes() == b"fund,nav\n"
+
+    @pytest.mark.parametrize("file_name", ["..", ".", "a/.."])
+    def test_reserved_names_are_rejected(self, client, tmp_path, file_name):
+        """Test names that resolve to a directory are rejected with 400."""
+        response = self._upload(client, file_name)
+
+        assert response.status_code == 400
+        assert not any(tmp_path.iterdir())
@@ -0,0 +1,133 @@
+"""Unit tests for the auth gateway's JWKS loading and token verification."""
+
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.append(str(Path(__file__).parents[2] / "Auth_gateway"))
+
+import auth_service  # noqa: E402
+
+ISSUER = "http://keycloak.test/realms/authentication"
+
+
+def _signing_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    return private_key, {**jwk, "kid": kid, "use": "sig", "alg": "RS256"}
+
+
+def _token(private_key, kid, issuer=ISSUER):
+    claims = {"sub": "u1", "iss": issuer, "exp": int(time.time()) + 300}
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+class FakeKeycloak:
+    """Certs endpoint that serves a configurable key set and counts fetches."""
+
+    def __init__(self, *jwks):
+        self.keys = list(jwks)
+        self.status_code = 200
+        self.fetches = 0
+
+    def handler(self, request):
+        self.fetches += 1
+        if self.status_code != 200:
+            return httpx.Response(self.status_code)
+        return httpx.Response(200, json={"keys": self.keys})
+
+    def client(self):
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+
+@pytest.fixture(autouse=True)
+def fresh_keys(monkeypatch):
+    """Start every test with no keys loaded and no recent fetch."""
+    monkeypatch.setattr(auth_service, "KEYCLOAK_INTERNAL_URL", "http://keycloak.test")
+    monkeypatch.setattr(auth_service, "KEYCLOAK_ISSUERS", frozenset({ISSUER}))
+    monkeypatch.setattr(auth_service, "_jwks_fetched_at", float("-inf"))
+    auth_service._signing_keys.clear()
+    auth_service._decode_cached.cache_clear()
+    yield
+    auth_service._signing_keys.clear()
+    auth_service._decode_cached.cache_clear()
+
+
+def _expire_cooldown(monkeypatch):
+    monkeypatch.setattr(
+        auth_service,
+        "_jwks_fetched_at",
+        auth_service._jwks_fetched_at - auth_service.JWKS_REFRESH_COOLDOWN,
+    )
+
+
+@pytest.mark.anyio
+class TestSigningKeyRefresh:
+    """Test the JWKS is refetched on demand, at most once per cooldown."""
+
+    async def test_startup_failure_recovers_after_cooldown(self, monkeypatch):
+        """Test a failed startup fetch is retried once the cooldown has passed."""
+        private_key, jwk = _signing_key("k1")
+        keycloak = FakeKeycloak(jwk)
+        keycloak.status_code = 503
+        token = _token(private_key, "k1")
+
+        async with keycloak.client() as client:
+            assert await auth_service._load_signing_keys(client) is False
+            keycloak.status_code = 200
+
+            assert await auth_service.decode_token(token, client) is None
+            assert keycloak.fetches == 1
+
+            _expire_cooldown(monkeypatch)
+            claims = await auth_service.decode_token(token, client)
+
+        assert claims["sub"] == "u1"
+        assert keycloak.fetches == 2
+
+    async def test_rotated_key_is_fetched(self, monkeypatch):
+        """Test a token signed with a new kid is verified after a refetch."""
+        old_key, old_jwk = _signing_key("k1")
+        new_key, new_jwk = _signing_key("k2")
+        keycloak = FakeKeycloak(old_jwk)
+
+        async with keycloak.client() as client:
+            assert await auth_service._load_signing_keys(client) is True
+            keycloak.keys = [new_jwk]
+            _expire_cooldown(monkeypatch)
+
+            claims = await auth_service.decode_token(_token(new_key, "k2"), client)
+            retired = await auth_service.decode_token(_token(old_key, "k1"), client)
+
+        assert claims["sub"] == "u1"
+        assert retired is None
+        assert keycloak.fetches == 2
+
+    async def test_unknown_kids_are_rate_limited(self, monkeypatch):
+        """Test tokens with made-up kids trigger at most one refetch per cooldown."""
+        private_key, jwk = _signing_key("k1")
+        keycloak = FakeKeycloak(jwk)
+
+        async with keycloak.client() as client:
+            await auth_service._load_signing_keys(client)
+            _expire_cooldown(monkeypatch)
+
+            for kid in ("made-up-1", "made-up-2", "made-up-3"):
+                assert await auth_service.decode_token(_token(private_key, kid), client) is None
+
+        assert keycloak.fetches == 2
+
+    async def test_foreign_issuer_is_rejected(self):
+        """Test a correctly signed token from another realm is not accepted."""
+        private_key, jwk = _signing_key("k1")
+        keycloak = FakeKeycloak(jwk)
+        token = _token(private_key, "k1", issuer="http://keycloak.test/realms/other")
+
+        async with keycloak.client() as client:
+            await auth_service._load_signing_keys(client)
+            assert await auth_service.decode_token(token, client) is None
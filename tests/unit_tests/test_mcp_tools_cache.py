@@ -0,0 +1,83 @@
+"""Unit tests for the MCP agent's tool list cache."""
+
+import importlib
+
+import pytest
+
+# The package re-exports the compiled graph under the module's name
+agent_graph = importlib.import_module("src.agent.graph")
+
+
+class FakeTool:
+    """Stand-in MCP tool; the cache only looks at its name."""
+
+    def __init__(self, name):
+        self.name = name
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Replace the server fetch with one that replays queued results."""
+    results = []
+    calls = []
+
+    async def fake_fetch():
+        calls.append(1)
+        return results.pop(0)
+
+    monkeypatch.setattr(agent_graph, "_fetch_mcp_tools", fake_fetch)
+    monkeypatch.setattr(agent_graph, "_tools_cache", None)
+    return results, calls
+
+
+@pytest.mark.anyio
+class TestToolListCache:
+    """Test which fetched tool lists are reused and for how long."""
+
+    async def test_complete_list_is_reused(self, fetches):
+        """Test a list from every server is served from the cache."""
+        results, calls = fetches
+        results.append(([FakeTool("list_orders")], True))
+
+        await agent_graph._load_mcp_tools()
+        tools, tools_by_name = await agent_graph._load_mcp_tools()
+
+        assert len(calls) == 1
+        assert list(tools_by_name) == ["list_orders"]
+
+    async def test_partial_list_expires_after_partial_ttl(self, fetches, monkeypatch):
+        """Test a list missing a failed server is refetched once its short TTL passes."""
+        results, calls = fetches
+        monkeypatch.setattr(agent_graph, "MCP_TOOLS_PARTIAL_TTL", -1)
+        results.append(([FakeTool("list_orders")], False))
+        results.append(([FakeTool("list_orders"), FakeTool("get_nav")], True))
+
+        await agent_graph._load_mcp_tools()
+        tools, _ = await agent_graph._load_mcp_tools()
+
+        assert len(calls) == 2
+        assert [tool.name for tool in tools] == ["list_orders", "get_nav"]
+
+    async def test_partial_list_uses_partial_ttl(self, fetches, monkeypatch):
+        """Test a partial list is kept for MCP_TOOLS_PARTIAL_TTL, not MCP_TOOLS_TTL."""
+        results, _ = fetches
+        monkeypatch.setattr(agent_graph, "MCP_TOOLS_TTL", 300)
+        monkeypatch.setattr(agent_graph, "MCP_TOOLS_PARTIAL_TTL", 15)
+        results.append(([FakeTool("list_orders")], False))
+
+        await agent_graph._load_mcp_tools()
+
+        expires_at = agent_graph._tools_cache[0]
+        assert expires_at - agent_graph.time.monotonic() <= 15
+
+    async def test_empty_list_is_not_cached(self, fetches):
+        """Test a fetch where every server failed is retried on the next call."""
+        results, calls = fetches
+        results.append(([], False))
+        results.append(([FakeTool("list_orders")], True))
+
+        await agent_graph._load_mcp_tools()
+        tools, _ = await agent_graph._load_mcp_tools()
+
+        assert len(calls) == 2
+        assert [tool.name for tool in tools] == ["list_orders"]
@@ -0,0 +1,52 @@
+"""Unit tests for the order agent's upload file cache."""
+
+import os
+
+from src.order_agent import graph as order_graph
+
+
+class TestUploadCache:
+    """Test upload payloads are reused only while the file is unchanged."""
+
+    def test_unchanged_file_is_read_once(self, tmp_path, monkeypatch):
+        """Test repeat uploads of the same file reuse the cached bytes."""
+        reads = []
+        read_bytes = order_graph.Path.read_bytes
+
+        def counting_read_bytes(path):
+            reads.append(path)
+            return read_bytes(path)
+
+        monkeypatch.setattr(order_graph.Path, "read_bytes", counting_read_bytes)
+        order_graph._read_upload.cache_clear()
+        path = tmp_path / "orders.csv"
+        path.write_bytes(b"id,qty\n1,5\n")
+
+        assert order_graph._load_upload(str(path)) == b"id,qty\n1,5\n"
+        assert order_graph._load_upload(str(path)) == b"id,qty\n1,5\n"
+        assert len(reads) == 1
+
+    def test_rewritten_file_is_read_again(self, tmp_path):
+        """Test a file rewritten in place is not served from the cache."""
+        order_graph._read_upload.cache_clear()
+        path = tmp_path / "orders.csv"
+        path.write_bytes(b"id,qty\n1,5\n")
+        order_graph._load_upload(str(path))
+
+        path.write_bytes(b"id,qty\n1,6\n")
+        # Same size, so only the modification time tells the versions apart
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        assert order_graph._load_upload(str(path)) == b"id,qty\n1,6\n"
+
+    def test_large_file_is_not_cached(self, tmp_path, monkeypatch):
+        """Test files over UPLOAD_CACHE_MAX_BYTES bypass the cache."""
+        monkeypatch.setattr(order_graph, "UPLOAD_CACHE_MAX_BYTES", 4)
+        order_graph._read_upload.cache_clear()
+        path = tmp_path / "orders.csv"
+        path.write_bytes(b"id,qty\n1,5\n")
+
+        order_graph._load_upload(str(path))
+
+        assert order_graph._read_upload.cache_info().currsize == 0
@@ -0,0 +1,197 @@
+"""Unit tests for the router agent's classification helpers."""
+
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.router_agent import graph as router
+from src.router_agent.graph import _check_agent_access, _parse_route_decision
+
+
+class TestRouteParsing:
+    """Test parsing of the classifier's ROUTE/REASON reply."""
+
+    def test_parse_route_line(self):
+        """Test the decision is read from the ROUTE line."""
+        reply = "ROUTE: nav\nREASON: user uploaded a NAV file"
+        assert _parse_route_decision(reply) == "nav"
+
+    def test_parse_route_is_case_insensitive(self):
+        """Test the decision is normalised to lower case."""
+        assert _parse_route_decision("ROUTE: Order\nREASON: upload") == "order"
+
+    def test_parse_route_after_preamble(self):
+        """Test the ROUTE line is found after leading text."""
+        reply = "Sure.\nROUTE: general\nREASON: greeting"
+        assert _parse_route_decision(reply) == "general"
+
+    def test_parse_route_with_markdown(self):
+        """Test emphasis and punctuation around the decision are ignored."""
+        assert _parse_route_decision("**ROUTE:** Nav.\nREASON: upload") == "nav"
+
+    def test_parse_route_from_content_blocks(self):
+        """Test list-shaped message content is handled."""
+        reply = [{"type": "text", "text": "ROUTE: order\nREASON: order file"}]
+        assert _parse_route_decision(reply) == "order"
+
+    def test_unknown_route_is_not_a_decision(self):
+        """Test decisions outside the known routes are not parsed."""
+        assert _parse_route_decision("ROUTE: billing") is None
+
+    def test_missing_route_is_not_a_decision(self):
+        """Test replies without a ROUTE line are not parsed."""
+        assert _parse_route_decision("I am not sure.") is None
+
+
+class TestAgentAccess:
+    """Test role-based access to subagents."""
+
+    def test_role_grants_matching_agent(self):
+        """Test a distributor may reach the order agent but not NAV."""
+        user = {"user_id": "u1", "roles": ["Distributor"]}
+        assert _check_agent_access(user, "order")[0] is True
+        assert _check_agent_access(user, "nav")[0] is False
+
+    def test_admin_reaches_every_agent(self):
+        """Test admin is allowed for all known agents."""
+        user = {"user_id": "u1", "role": "admin"}
+        for agent in ("order", "nav", "mcp"):
+            assert _check_agent_access(user, agent)[0] is True
+
+    def test_unknown_agent_is_denied(self):
+        """Test unknown agents are rejected."""
+        allowed, reason = _check_agent_access({"roles": ["admin"]}, "billing")
+        assert not allowed
+        assert reason == "Unknown agent."
+
+
+class TestFastRoute:
+    """Test the rule-based routing shortcut."""
+
+    @pytest.mark.parametrize(
+        "message", ["hello", "Thanks!", "Show me the fund list for account 7"]
+    )
+    def test_plain_question_routes_to_general(self, message):
+        """Test queries without order, NAV or upload hints skip the classifier."""
+        assert router._fast_route(message) == "general"
+
+    @pytest.mark.parametrize(
+        "message",
+        [
+            "upload order",
+            "order file",
+            "submit order batch 12",
+            "upload nav",
+            "nav file",
+            "here is today's NAV data",
+            "compare the NAVs for these funds",
+            "start nav ingestion",
+            "What is the status of order 42?",
+        ],
+    )
+    def test_order_and_nav_keywords_need_the_classifier(self, message):
+        """Test the router prompt's own keywords are left to the model."""
+        assert router._fast_route(message) is None
+
+    def test_upload_message_needs_the_classifier(self):
+        """Test upload messages are left to the model."""
+        message = (
+            "I have uploaded a file named 'nav.json'.\n"
+            "The file is saved locally at: /app/uploads/nav.json"
+        )
+        assert router._fast_route(message) is None
+
+
+class TestRouteCache:
+    """Test the routing decision cache."""
+
+    def test_normalized_queries_share_an_entry(self):
+        """Test case and whitespace differences hit the same entry."""
+        router._route_cache.clear()
+        router._cache_route(router._route_cache_key("Show  my\nNAV"), "general")
+        key = router._route_cache_key("show my nav ")
+        assert router._get_cached_route(key) == "general"
+
+    def test_keys_are_fixed_size_digests(self):
+        """Test long queries are keyed by a digest and blank ones are not cached."""
+        assert len(router._route_cache_key("upload " * 1000)) == 16
+        assert router._route_cache_key(" \n\t") is None
+
+    def test_expired_entry_is_dropped(self, monkeypatch):
+        """Test entries past the TTL are not returned."""
+        router._route_cache.clear()
+        monkeypatch.setattr(router, "ROUTE_CACHE_TTL", -1)
+        router._cache_route("hello", "general")
+        assert router._get_cached_route("hello") is None
+        assert "hello" not in router._route_cache
+
+    def test_hits_and_misses_are_counted(self, monkeypatch):
+        """Test lookups are reflected in route_cache_info."""
+        router._route_cache.clear()
+        monkeypatch.setattr(router, "_route_cache_stats", router.Counter())
+        router._get_cached_route("hello")
+        router._cache_route("hello", "general")
+        router._get_cached_route("hello")
+        assert router.route_cache_info() == {"hits": 1, "misses": 1, "size": 1}
+
+
+class TestSubagentHistory:
+    """Test the user history handed to subagents."""
+
+    def test_only_recent_user_turns_are_kept(self, monkeypatch):
+        """Test AI replies are dropped and the oldest turns are trimmed."""
+        monkeypatch.setattr(router, "SUBAGENT_HISTORY_TURNS", 2)
+        messages = []
+        for i in range(4):
+            messages += [HumanMessage(content=f"q{i}"), AIMessage(content=f"a{i}")]
+        recent = router._recent_user_messages({"messages": messages})
+        assert [m.content for m in recent] == ["q2", "q3"]
+
+
+@pytest.mark.anyio
+class TestSharedClassification:
+    """Test coalescing of identical concurrent classifications."""
+
+    async def test_concurrent_identical_queries_share_one_call(self, monkeypatch):
+        """Test only one classifier call runs for simultaneous duplicates."""
+        calls = 0
+
+        async def fake_classifier(user_message):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "general"
+
+        monkeypatch.setattr(router, "_run_classifier", fake_classifier)
+        message = HumanMessage(content="hi")
+        routes = await asyncio.gather(
+            *(router._classify_shared("hi", message) for _ in range(5))
+        )
+        assert routes == ["general"] * 5
+        assert calls == 1
+        assert "hi" not in router._inflight_routes
+
+
+@pytest.mark.anyio
+class TestClassifyQuery:
+    """Test the routing node's use of the classifier and the route cache."""
+
+    async def test_unparseable_reply_is_not_cached(self, monkeypatch):
+        """Test a reply without a ROUTE line falls back to general only once."""
+        replies = [None, "nav"]
+
+        async def fake_classifier(user_message):
+            return replies.pop(0)
+
+        monkeypatch.setattr(router, "_run_classifier", fake_classifier)
+        router._route_cache.clear()
+        state = {"messages": [HumanMessage(content="upload nav file")]}
+        config = {"configurable": {"user": {"user_id": "u1"}}}
+
+        first = await router.classify_query(state, config)
+        second = await router.classify_query(state, config)
+
+        assert first == {"route_decision": "general"}
+        assert second == {"route_decision": "nav"}
+        assert router._get_cached_route(router._route_cache_key("upload nav file")) == "nav"